@@ -0,0 +1,60 @@
+#====================================================================================
+# Author: Sara
+# Created on: 18 Oct 2026
+# Brief: One-shot migration of the comma-joined TM_Images.BibTags strings into the
+#        normalized TM_ImageBibs (ImageID, Bib) table used by /search-bib.
+#        Safe to run more than once, the rows of every tagged image are rebuilt.
+#        The API runs it on an event DB without TM_ImageBibs when it first opens it.
+#====================================================================================
+
+import glob
+import os
+import sqlite3
+import sys
+
+# Add parent directory to path to enable imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from app.dbconnector import local_db_folder, init_db, normalize_bib
+
+def migrate_db(db_path):
+    # Creates TM_ImageBibs if the DB does not have it yet
+    init_db(db_path)
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute("SELECT ID, BibTags FROM TM_Images WHERE BibTags IS NOT NULL AND BibTags != ''")
+    rows = cursor.fetchall()
+
+    bib_rows = set()
+    for image_id, bib_tags in rows:
+        for bib in bib_tags.split(','):
+            bib = normalize_bib(bib)
+            if bib:
+                bib_rows.add((image_id, bib))
+
+    cursor.executemany("DELETE FROM TM_ImageBibs WHERE ImageID = ?", [(row[0],) for row in rows])
+    cursor.executemany("INSERT INTO TM_ImageBibs (ImageID, Bib) VALUES (?, ?)", sorted(bib_rows))
+    conn.commit()
+    conn.close()
+    print(f"{os.path.basename(db_path)}: {len(rows)} tagged images -> {len(bib_rows)} bib rows")
+
+# Migrate an event DB created before TM_ImageBibs existed, nothing to do when it has the table.
+# Returns True when the DB was migrated.
+def migrate_if_needed(db_path):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'TM_ImageBibs'")
+    has_table = cursor.fetchone() is not None
+    conn.close()
+    if has_table:
+        return False
+    migrate_db(db_path)
+    return True
+
+if __name__ == "__main__":
+    db_folder = sys.argv[1] if len(sys.argv) > 1 else local_db_folder
+    db_files = sorted(glob.glob(os.path.join(db_folder, "*_ImageDB.sqlite")))
+    if not db_files:
+        print(f"No *_ImageDB.sqlite files found in {db_folder}")
+    for db_path in db_files:
+        migrate_db(db_path)
@@ -7,17 +7,21 @@
 #   2 - Update the  MIN_LENGTH_OF_BIB_NUMBER value if needed 
 #====================================================================================
 
+import argparse
 import cv2
 import easyocr
+import functools
+import multiprocessing as mp
 import os
 import pandas as pd
 import sqlite3
 import sys
+import time
 
 # Add parent directory to path to enable imports
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
 
-from app.dbconnector import local_db_path
+from app.dbconnector import local_db_path, init_db, save_image_bibs, FACE_BOX_COLUMNS
 
 # Data configuration may get changed later
 EventID = 1
@@ -25,15 +29,36 @@ EventID = 1
 # Added min size of bib number to fix the wrong behaviour of detecting "" as 66
 MIN_LENGTH_OF_BIB_NUMBER = 3
 
-reader = easyocr.Reader(['en'])
- 
-def smart_bib_crop(img, min_conf=0.4, expand=0.25):
-    h, w = img.shape[:2]
-    # results = reader.readtext(img)  # [(bbox, text, conf), ...]
-    # Filter it to numeric while reading itself.
-    results = reader.readtext(img, allowlist='0123456789') # [(bbox, text, conf), ...]
+# Bulk tagging: images per commit and how often progress is printed
+COMMIT_EVERY = 50
+PROGRESS_EVERY_SECS = 10
 
-    # Collect numeric detections
+# Only digits are read, bibs are numeric
+BIB_ALLOWLIST = '0123456789'
+
+# Single pass mode: images per readtext_batched call and the longest side images are
+# scaled to, so photos from the same camera end up in the same size bucket
+OCR_BATCH_SIZE = 8
+OCR_MAX_DIM = 1600
+
+# Face ROI mode: a bib sits on the torso below the face. The torso region starts
+# TORSO_TOP face heights below the chin, is TORSO_HEIGHT face heights tall and reaches
+# TORSO_SIDE face widths past each side of the face.
+TORSO_TOP = 0.3
+TORSO_HEIGHT = 4.0
+TORSO_SIDE = 1.25
+
+# EasyOCR reader, created on first use so every worker process loads its own model
+reader = None
+
+def get_reader():
+    global reader
+    if reader is None:
+        reader = easyocr.Reader(['en'])
+    return reader
+
+# Keep the readtext results that look like a bib number, as (x1, y1, x2, y2, text, conf)
+def numeric_boxes_from_results(results, min_conf=0.4):
     numeric_boxes = []
     for (bbox, text, conf) in results:
         if conf >= min_conf and text.strip().isdigit() and len(text.strip()) >= MIN_LENGTH_OF_BIB_NUMBER:
@@ -42,7 +67,25 @@ def smart_bib_crop(img, min_conf=0.4, expand=0.25):
             ys = [p[1] for p in bbox]
             x1, y1 = int(min(xs)), int(min(ys))
             x2, y2 = int(max(xs)), int(max(ys))
-            numeric_boxes.append((x1, y1, x2, y2, text, conf))
+            numeric_boxes.append((x1, y1, x2, y2, text.strip(), conf))
+    return numeric_boxes
+
+# Each numeric box is one bib, highest confidence first, duplicates dropped
+def bibs_from_boxes(numeric_boxes):
+    bibs = []
+    for box in sorted(numeric_boxes, key=lambda b: -b[5]):
+        if box[4] not in bibs:
+            bibs.append(box[4])
+    return bibs
+
+def smart_bib_crop(img, min_conf=0.4, expand=0.25):
+    h, w = img.shape[:2]
+    # results = reader.readtext(img)  # [(bbox, text, conf), ...]
+    # Filter it to numeric while reading itself.
+    results = get_reader().readtext(img, allowlist=BIB_ALLOWLIST) # [(bbox, text, conf), ...]
+
+    # Collect numeric detections
+    numeric_boxes = numeric_boxes_from_results(results, min_conf)
 
     if not numeric_boxes:
         return None, []  # No numeric text found
@@ -81,6 +124,8 @@ def preprocess_for_easyocr(img):
 
 def extract_bib_easyocr(image_path):
     img = cv2.imread(image_path)
+    if img is None:
+        raise ValueError(f"Could not read image {image_path}")
     # Not working properly need more analysis
     # cleanedimg = preprocess_for_easyocr(img)
 
@@ -90,7 +135,7 @@ def extract_bib_easyocr(image_path):
         return [], None
 
     # Second pass: read only the crop
-    results = reader.readtext(crop)
+    results = get_reader().readtext(crop)
 
     digits = [t.strip() for (_, t, c) in results if t.strip().isdigit() and c >= 0.5]
 
@@ -100,6 +145,41 @@ def extract_bib_easyocr(image_path):
 
     return digits, crop
 
+# Load an image for the single pass mode, scaled down so the longest side is max_dim
+def load_ocr_image(image_path, max_dim=OCR_MAX_DIM):
+    img = cv2.imread(image_path)
+    if img is None:
+        raise ValueError(f"Could not read image {image_path}")
+    return scale_to_max_dim(img, max_dim)
+
+# Scale an image down so its longest side is at most max_dim
+def scale_to_max_dim(img, max_dim=OCR_MAX_DIM):
+    h, w = img.shape[:2]
+    scale = max_dim / float(max(h, w))
+    if scale < 1:
+        img = cv2.resize(img, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+    return img
+
+# Single pass alternative to extract_bib_easyocr for a list of images.
+# One detector + recognizer pass per image; every numeric box found is reported as its own bib
+# (so several runners in a frame give several bibs). Images are grouped into buckets of the
+# same size and each bucket goes through EasyOCR's batched API batch_size images at a time.
+# Returns one bib list per image, in input order.
+def extract_bibs_batched(images, batch_size=OCR_BATCH_SIZE, min_conf=0.4):
+    buckets = {}
+    for pos, img in enumerate(images):
+        buckets.setdefault(img.shape[:2], []).append(pos)
+
+    bibs = [None] * len(images)
+    for positions in buckets.values():
+        for start in range(0, len(positions), batch_size):
+            chunk = positions[start:start + batch_size]
+            results = get_reader().readtext_batched([images[pos] for pos in chunk],
+                                                    allowlist=BIB_ALLOWLIST, batch_size=batch_size)
+            for pos, image_results in zip(chunk, results):
+                bibs[pos] = bibs_from_boxes(numeric_boxes_from_results(image_results, min_conf))
+    return bibs
+
 def process_folder(folder_path,output_excel="bib_results.xlsx"):
     tags = {}
     results_list = []
@@ -126,44 +206,203 @@ def process_folder(folder_path,output_excel="bib_results.xlsx"):
 
     return tags
 
-if __name__ == "__main__":
-    # folder = r"C:\Work\FMF\Images"
-    # folder = r"C:\Work\FMF\Images\Downloads\Batch1"
-    # process_folder(folder)
+# Worker process: OCR one TM_Images row. Returns (ImageID, bibs, error)
+def _tag_image(img_info):
+    img_id, img_filename, img_filepath = img_info
+    try:
+        bibs, _ = extract_bib_easyocr(img_filepath)
+        return img_id, bibs, None
+    except Exception as e:
+        return img_id, None, f"{img_filename}: {e}"
+
+# Torso region (x1, y1, x2, y2) below a (top, right, bottom, left) face box, clamped to the image
+def torso_box(face_box, shape):
+    top, right, bottom, left = face_box
+    h, w = shape[:2]
+    fh, fw = bottom - top, right - left
+    x1 = max(0, int(left - TORSO_SIDE * fw))
+    x2 = min(w, int(right + TORSO_SIDE * fw))
+    y1 = max(0, int(bottom + TORSO_TOP * fh))
+    y2 = min(h, int(bottom + (TORSO_TOP + TORSO_HEIGHT) * fh))
+    return x1, y1, x2, y2
+
+# Merge overlapping regions so runners standing close together are read once
+def merge_regions(regions):
+    regions = [r for r in regions if r[2] > r[0] and r[3] > r[1]]
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(regions)):
+            for j in range(i + 1, len(regions)):
+                a, b = regions[i], regions[j]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    regions[i] = (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+                    del regions[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return regions
+
+# Face guided OCR: read only the torso regions below the faces found at ingestion
+# (TM_Faces boxes), one single pass readtext per region. Falls back to the full frame
+# (scaled to OCR_MAX_DIM) when the image has no face box.
+# The image is read without applying the EXIF orientation, the frame the boxes were stored in.
+def extract_bibs_face_roi(image_path, face_boxes, min_conf=0.4):
+    if not face_boxes:
+        results = get_reader().readtext(load_ocr_image(image_path), allowlist=BIB_ALLOWLIST)
+        return bibs_from_boxes(numeric_boxes_from_results(results, min_conf))
+
+    img = cv2.imread(image_path, cv2.IMREAD_COLOR | cv2.IMREAD_IGNORE_ORIENTATION)
+    if img is None:
+        raise ValueError(f"Could not read image {image_path}")
+    return extract_bibs_from_image(img, face_boxes, min_conf)
+
+# extract_bibs_face_roi for an image that is already decoded (full resolution, EXIF
+# orientation not applied, BGR or RGB)
+def extract_bibs_from_image(img, face_boxes, min_conf=0.4):
+    if not face_boxes:
+        results = get_reader().readtext(scale_to_max_dim(img), allowlist=BIB_ALLOWLIST)
+        return bibs_from_boxes(numeric_boxes_from_results(results, min_conf))
+
+    numeric_boxes = []
+    for x1, y1, x2, y2 in merge_regions([torso_box(box, img.shape) for box in face_boxes]):
+        results = get_reader().readtext(scale_to_max_dim(img[y1:y2, x1:x2]), allowlist=BIB_ALLOWLIST)
+        numeric_boxes.extend(numeric_boxes_from_results(results, min_conf))
+    return bibs_from_boxes(numeric_boxes)
+
+# Worker process: face guided OCR of one (ImageID, FileName, FilePath, face boxes) row
+def _tag_image_face_roi(img_info):
+    img_id, img_filename, img_filepath, face_boxes = img_info
+    try:
+        return img_id, extract_bibs_face_roi(img_filepath, face_boxes), None
+    except Exception as e:
+        return img_id, None, f"{img_filename}: {e}"
+
+# {ImageID: [(top, right, bottom, left), ...]} of the faces with a stored box
+def load_face_boxes(cursor):
+    cursor.execute(f"SELECT ImageID, {', '.join(FACE_BOX_COLUMNS)} FROM TM_Faces WHERE BoxTop IS NOT NULL")
+    face_boxes = {}
+    for row in cursor.fetchall():
+        face_boxes.setdefault(row[0], []).append(row[1:])
+    return face_boxes
+
+# Worker process: single pass OCR of a chunk of TM_Images rows. Returns a list of (ImageID, bibs, error)
+def _tag_images_batched(img_infos, batch_size=OCR_BATCH_SIZE):
+    outcomes = []
+    loaded = []
+    for img_id, img_filename, img_filepath in img_infos:
+        try:
+            loaded.append((img_id, load_ocr_image(img_filepath)))
+        except Exception as e:
+            outcomes.append((img_id, None, f"{img_filename}: {e}"))
+    if not loaded:
+        return outcomes
+    try:
+        all_bibs = extract_bibs_batched([img for _, img in loaded], batch_size)
+        outcomes.extend((img_id, bibs, None) for (img_id, _), bibs in zip(loaded, all_bibs))
+    except Exception as e:
+        outcomes.extend((img_id, None, f"ImageID {img_id}: {e}") for img_id, _ in loaded)
+    return outcomes
+
+# Tag every image of the event with the bibs found by OCR.
+# - workers: OCR processes, each loads its own EasyOCR reader (1 = run in this process)
+# - commits every commit_every images, so a crash only loses the last partial batch
+# - images already tagged (BibTags not NULL, also '' = no bib found) are skipped unless force
+# - single_pass: use extract_bibs_batched (one OCR pass, batch_size images per batch) instead
+#   of the two pass extract_bib_easyocr
+# - face_roi: use extract_bibs_face_roi, OCR only the torso below each stored face box
+# Failed images keep BibTags NULL and are retried on the next run.
+def bulk_tag_images(workers=1, commit_every=COMMIT_EVERY, force=False, event_id=EventID,
+                    single_pass=False, batch_size=OCR_BATCH_SIZE, face_roi=False):
+    # Make sure TM_ImageBibs exists
+    init_db()
     conn = sqlite3.connect(local_db_path)
+    conn.execute("PRAGMA journal_mode=WAL")
     cursor = conn.cursor()
     cursor.execute("""
                     SELECT ID, TM_Images.FileName, TM_Images.FilePath
-                    FROM TM_Images WHERE EventID = ?
-                """, (EventID,))
-    img_records = cursor.fetchall()    
-
-    # Loop through all records and process each image
-    processed_count = 0
-
-    for img_info in img_records:
-        img_id = img_info[0]
-        img_filename = img_info[1]
-        img_filepath = img_info[2]
-        
-        print(f"Processing {img_filename}...")
-        
-        # Extract bibs from the image
-        bibs, img = extract_bib_easyocr(img_filepath) 
-        bibs_str = ', '.join(bibs) if bibs else ''
-        
-        # Update the database with detected bibs
-        cursor.execute("""
-            UPDATE TM_Images 
-            SET BibTags = ? 
-            WHERE ID = ?
-        """, (bibs_str, img_id))
-        
-        processed_count += 1
-        print(f"  Found bibs: {bibs_str if bibs_str else 'None'}")
-    
-    # Commit changes and close connection
-    conn.commit()
-    conn.close()
-    
-    print(f"\n✅ Processed {processed_count} images and updated database")
\ No newline at end of file
+                    FROM TM_Images WHERE EventID = ? AND (BibTags IS NULL OR ?)
+                    ORDER BY ID
+                """, (event_id, int(force)))
+    img_records = cursor.fetchall()
+    total = len(img_records)
+    if face_roi:
+        mode = "face guided torso regions"
+    elif single_pass:
+        mode = f"single pass in batches of {batch_size}"
+    else:
+        mode = "two pass"
+    print(f"Tagging {total} images with {workers} OCR workers, {mode}")
+
+    pool = mp.Pool(workers) if workers > 1 else None
+    if face_roi:
+        face_boxes = load_face_boxes(cursor)
+        img_records = [(*record, face_boxes.get(record[0], [])) for record in img_records]
+        results = pool.imap_unordered(_tag_image_face_roi, img_records, chunksize=2) if pool \
+            else map(_tag_image_face_roi, img_records)
+    elif single_pass:
+        # Hand each worker several batches worth of images so it has enough to bucket by size
+        chunk_size = batch_size * 4
+        chunks = [img_records[i:i + chunk_size] for i in range(0, total, chunk_size)]
+        tag_chunk = functools.partial(_tag_images_batched, batch_size=batch_size)
+        chunk_results = pool.imap_unordered(tag_chunk, chunks) if pool else map(tag_chunk, chunks)
+        results = (outcome for outcomes in chunk_results for outcome in outcomes)
+    else:
+        results = pool.imap_unordered(_tag_image, img_records, chunksize=2) if pool else map(_tag_image, img_records)
+
+    processed_count = failed_count = 0
+    start = last_report = time.time()
+    try:
+        for img_id, bibs, error in results:
+            if error:
+                failed_count += 1
+                print(f"  Failed {error}")
+            else:
+                # Update the database with detected bibs (BibTags and TM_ImageBibs)
+                save_image_bibs(cursor, img_id, bibs)
+                processed_count += 1
+                if processed_count % commit_every == 0:
+                    conn.commit()
+
+            now = time.time()
+            if now - last_report >= PROGRESS_EVERY_SECS:
+                last_report = now
+                done = processed_count + failed_count
+                rate = done / (now - start)
+                eta = (total - done) / rate if rate else 0
+                print(f"[{done}/{total}] {rate:.2f} images/s, ETA {eta / 60:.1f} min")
+    except BaseException:
+        # Interrupted (Ctrl-C) or failed: stop the workers instead of waiting for the queued images
+        if pool:
+            pool.terminate()
+        raise
+    finally:
+        # Commit what is done even when interrupted
+        conn.commit()
+        conn.close()
+    if pool:
+        pool.close()
+        pool.join()
+
+    elapsed = max(time.time() - start, 1e-9)
+    print(f"\n✅ Processed {processed_count} images ({failed_count} failed) in {elapsed:.0f}s "
+          f"= {processed_count / elapsed:.2f} images/s and updated database")
+
+if __name__ == "__main__":
+    # folder = r"C:\Work\FMF\Images"
+    # folder = r"C:\Work\FMF\Images\Downloads\Batch1"
+    # process_folder(folder)
+    parser = argparse.ArgumentParser(description="Tag the event images with the bib numbers found by OCR")
+    parser.add_argument("--workers", type=int, default=1, help="OCR worker processes (0 = one per CPU core)")
+    parser.add_argument("--commit-every", type=int, default=COMMIT_EVERY, help="Images per DB commit")
+    parser.add_argument("--force", action="store_true", help="Re-tag images that already have tags")
+    parser.add_argument("--single-pass", action="store_true",
+                        help="One batched OCR pass per image, each numeric box is a bib")
+    parser.add_argument("--batch-size", type=int, default=OCR_BATCH_SIZE, help="Images per OCR batch (--single-pass)")
+    parser.add_argument("--face-roi", action="store_true",
+                        help="OCR only the torso below each face found at ingestion (full frame if none)")
+    args = parser.parse_args()
+
+    bulk_tag_images(args.workers if args.workers > 0 else (os.cpu_count() or 1), args.commit_every, args.force,
+                    single_pass=args.single_pass, batch_size=args.batch_size, face_roi=args.face_roi)
@@ -7,9 +7,15 @@
 
 import os
 import sqlite3
+import hashlib
+import pickle
+import threading
+import time
+import numpy as np
 
 # Data configuration may get changed later
-EventID = 1
+# Event the ingestion scripts work on. The API serves every event of the DB folder.
+EventID = int(os.getenv('EVENT_ID', 1))
 
 DB_FILE = "ImageDB.sqlite"
 INDEX_FILE = "faiss_face_index.bin"
@@ -26,17 +32,34 @@ DB_FILE = str(EventID) +"_ImageDB.sqlite"
 INDEX_FILE = str(EventID) +"_faiss_face_index.bin"
 META_FILE = str(EventID) +"_face_metadata.pkl"
 
+# Full local paths of any event
+def event_db_path(event_id):
+    return os.path.join(local_db_folder, f"{int(event_id)}_ImageDB.sqlite")
+
+def event_index_path(event_id):
+    return os.path.join(local_db_folder, f"{int(event_id)}_faiss_face_index.bin")
+
 # Full local paths
-local_db_path = os.path.join(local_db_folder, DB_FILE)
-local_index_path = os.path.join(local_db_folder, INDEX_FILE)
+local_db_path = event_db_path(EventID)
+local_index_path = event_index_path(EventID)
 local_meta_path = os.path.join(local_db_folder, META_FILE)
 
+# Face embeddings are stored in TM_Faces.Embedding as raw little-endian float32 bytes
+# (128 dims = 512 bytes per face) so the index build can load them in one np.frombuffer.
+# Older DBs hold pickle.dumps() of a float64 array, see selfisearch/migrate_embeddings.py
+EMBEDDING_DIM = 128
+EMBEDDING_DTYPE = np.dtype('<f4')
+EMBEDDING_BLOB_SIZE = EMBEDDING_DIM * EMBEDDING_DTYPE.itemsize
+
+# TM_Faces columns of the face bounding box, same order as face_recognition locations
+FACE_BOX_COLUMNS = ("BoxTop", "BoxRight", "BoxBottom", "BoxLeft")
+
 # Local sub folders 
 LOCAL_IMAGE_FOLDER = os.getenv('IMAGE_FOLDER', r"C:\Work\FMF\Images")
 
 # Initialize DB
-def init_db():
-    conn = sqlite3.connect(local_db_path)
+def init_db(db_path=local_db_path):
+    conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS TM_Images (
@@ -52,8 +75,240 @@ def init_db():
             FaceID INTEGER PRIMARY KEY AUTOINCREMENT,
             ImageID INTEGER,
             Embedding BLOB,
+            BoxTop INTEGER,
+            BoxRight INTEGER,
+            BoxBottom INTEGER,
+            BoxLeft INTEGER,
             FOREIGN KEY(ImageID) REFERENCES TM_Images(ID)
         )
     """)
+    # Face bounding box in full resolution pixels of the stored image (EXIF orientation not
+    # applied), used to OCR only the torso below each face. NULL for faces ingested before.
+    cursor.execute("PRAGMA table_info(TM_Faces)")
+    face_columns = {row[1] for row in cursor.fetchall()}
+    for column in FACE_BOX_COLUMNS:
+        if column not in face_columns:
+            cursor.execute(f"ALTER TABLE TM_Faces ADD COLUMN {column} INTEGER")
+    # One row per ingested file so re-runs skip unchanged files and resume after a crash.
+    # ImageID is NULL for files in which no face was found.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS TM_IngestManifest (
+            FilePath TEXT PRIMARY KEY,
+            FileSize INTEGER,
+            MTime REAL,
+            ContentHash TEXT,
+            ImageID INTEGER
+        )
+    """)
+    # Normalized BIB tags, one row per (image, bib). The primary key starts with Bib so
+    # it is the index used by exact BIB lookups. TM_Images.BibTags keeps the joined string.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS TM_ImageBibs (
+            ImageID INTEGER NOT NULL,
+            Bib TEXT NOT NULL,
+            PRIMARY KEY (Bib, ImageID),
+            FOREIGN KEY(ImageID) REFERENCES TM_Images(ID)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS IX_ImageBibs_ImageID ON TM_ImageBibs (ImageID)")
     conn.commit()
-    conn.close()
\ No newline at end of file
+    conn.close()
+
+# Normalize a BIB number the same way for storing and searching
+def normalize_bib(bib):
+    return "".join(str(bib).split())
+
+# Replace the BIB tags of an image: BibTags string and TM_ImageBibs rows.
+# Runs on the caller's cursor so it joins the caller's transaction.
+def save_image_bibs(cursor, image_id, bibs):
+    bibs = sorted({normalize_bib(b) for b in bibs if normalize_bib(b)})
+    cursor.execute("UPDATE TM_Images SET BibTags = ? WHERE ID = ?", (', '.join(bibs), image_id))
+    cursor.execute("DELETE FROM TM_ImageBibs WHERE ImageID = ?", (image_id,))
+    cursor.executemany("INSERT INTO TM_ImageBibs (ImageID, Bib) VALUES (?, ?)", [(image_id, b) for b in bibs])
+    return bibs
+
+# Cheap "has the DB changed?" check for long running readers (the API server).
+# SQLite bumps PRAGMA data_version on a connection whenever another connection commits,
+# so one pragma on a kept-open connection tells whether cached data is stale.
+class DBChangeWatcher:
+    def __init__(self, db_path=local_db_path):
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self.version = self._read_version()
+
+    def _read_version(self):
+        return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    # True (once) when another connection committed since the last call
+    def changed(self):
+        with self._lock:
+            version = self._read_version()
+            if version == self.version:
+                return False
+            self.version = version
+            return True
+
+# Content hash used by the ingest manifest
+def file_content_hash(file_path, chunk_size=1024 * 1024):
+    digest = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# Convert one face encoding to the TM_Faces.Embedding BLOB format
+def embedding_to_blob(emb):
+    return np.asarray(emb, dtype=EMBEDDING_DTYPE).tobytes()
+
+# Convert TM_Faces (FaceID, Embedding) rows to (face_ids, float32 embedding matrix).
+# Rows still holding a legacy pickled embedding are decoded one by one.
+def load_embeddings(rows):
+    face_ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    blobs = [row[1] for row in rows]
+    if any(len(b) != EMBEDDING_BLOB_SIZE for b in blobs):
+        blobs = [b if len(b) == EMBEDDING_BLOB_SIZE else embedding_to_blob(pickle.loads(b)) for b in blobs]
+    embeddings = np.frombuffer(b"".join(blobs), dtype=EMBEDDING_DTYPE).reshape(-1, EMBEDDING_DIM)
+    return face_ids, embeddings.astype(np.float32)
+
+# Keeps one connection open for the whole ingestion run and writes images + faces
+# in batches. Committing once per image means one fsync per photo, which dominates
+# ingestion time, so rows are buffered and committed every batch_size images or
+# every flush_secs seconds, whichever comes first. Always close() (or use it as a
+# context manager) so the last partial batch is flushed.
+# When file_info (size, mtime, content hash) is given the file is also recorded in
+# TM_IngestManifest in the same transaction as its rows.
+class ImageDBWriter:
+    def __init__(self, db_path=local_db_path, event_id=EventID, batch_size=200, flush_secs=5.0):
+        self.event_id = event_id
+        self.batch_size = batch_size
+        self.flush_secs = flush_secs
+        self.conn = sqlite3.connect(db_path)
+        # WAL lets readers (the API) keep querying while ingestion writes
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._pending = []
+        self._pending_manifest = []
+        self._pending_deletes = []
+        self._last_flush = time.time()
+
+    # Return {FilePath: (FileSize, MTime, ContentHash, ImageID)} of all files ingested so far.
+    # Images stored before the manifest existed are included without size/time/hash, so they
+    # are re-encoded once and replace their old rows instead of being duplicated.
+    def load_manifest(self):
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT FilePath, ID FROM TM_Images")
+        manifest = {row[0]: (None, None, None, row[1]) for row in cursor.fetchall()}
+        cursor.execute("SELECT FilePath, FileSize, MTime, ContentHash, ImageID FROM TM_IngestManifest")
+        manifest.update({row[0]: row[1:] for row in cursor.fetchall()})
+        return manifest
+
+    # Store an image and its faces. replaces_image_id removes the rows of an older
+    # version of the same file in the same transaction.
+    # face_boxes, when given, holds one (top, right, bottom, left) box per embedding.
+    # bibs, when given, are stored as the image's BIB tags (see save_image_bibs).
+    def add(self, file_name, file_path, face_embeddings, file_info=None, replaces_image_id=None, face_boxes=None,
+            bibs=None):
+        if replaces_image_id is not None:
+            self._pending_deletes.append(replaces_image_id)
+        if face_boxes is None:
+            face_boxes = [None] * len(face_embeddings)
+        self._pending.append((file_name, file_path, face_embeddings, face_boxes, bibs, file_info))
+        self._maybe_flush()
+
+    # Record a file in the manifest without storing an image (no faces found / content unchanged)
+    def add_manifest(self, file_path, file_info, image_id=None, replaces_image_id=None):
+        if replaces_image_id is not None:
+            self._pending_deletes.append(replaces_image_id)
+        self._pending_manifest.append((file_path, *file_info, image_id))
+        self._maybe_flush()
+
+    def _maybe_flush(self):
+        if len(self._pending) + len(self._pending_manifest) >= self.batch_size \
+                or time.time() - self._last_flush >= self.flush_secs:
+            self.flush()
+
+    def flush(self):
+        if not (self._pending or self._pending_manifest or self._pending_deletes):
+            self._last_flush = time.time()
+            return
+        cursor = self.conn.cursor()
+        # Take the write lock first so the image IDs we hand out cannot be used by anyone else
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            if self._pending_deletes:
+                deletes = [(image_id,) for image_id in self._pending_deletes]
+                cursor.executemany("DELETE FROM TM_Faces WHERE ImageID = ?", deletes)
+                if self._has_table(cursor, "TM_ImageBibs"):
+                    cursor.executemany("DELETE FROM TM_ImageBibs WHERE ImageID = ?", deletes)
+                cursor.executemany("DELETE FROM TM_Images WHERE ID = ?", deletes)
+            next_id = self._next_image_id(cursor)
+            image_rows = []
+            face_rows = []
+            boxed_face_rows = []
+            manifest_rows = list(self._pending_manifest)
+            tagged = []
+            for image_id, (file_name, file_path, face_embeddings, face_boxes, bibs, file_info) in enumerate(self._pending, start=next_id):
+                if bibs is not None:
+                    tagged.append((image_id, bibs))
+                image_rows.append((image_id, file_name, file_path))
+                for emb, box in zip(face_embeddings, face_boxes):
+                    if box is None:
+                        face_rows.append((image_id, embedding_to_blob(emb)))
+                    else:
+                        boxed_face_rows.append((image_id, embedding_to_blob(emb), *box))
+                if file_info is not None:
+                    manifest_rows.append((file_path, *file_info, image_id))
+            # Statements are only run when they have rows: SQLite prepares them even for an empty
+            # executemany, which fails on the older schema of legacy process_images.py (no box
+            # columns, no TM_IngestManifest) that only ever gets plain images and faces
+            if image_rows and self.event_id is None:
+                cursor.executemany("INSERT INTO TM_Images (ID, FileName, FilePath) VALUES (?, ?, ?)", image_rows)
+            elif image_rows:
+                cursor.executemany("INSERT INTO TM_Images (ID, EventID, FileName, FilePath) VALUES (?, ?, ?, ?)",
+                                   [(i, self.event_id, n, p) for (i, n, p) in image_rows])
+            if face_rows:
+                cursor.executemany("INSERT INTO TM_Faces (ImageID, Embedding) VALUES (?, ?)", face_rows)
+            if boxed_face_rows:
+                cursor.executemany("""
+                    INSERT INTO TM_Faces (ImageID, Embedding, BoxTop, BoxRight, BoxBottom, BoxLeft)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, boxed_face_rows)
+            for image_id, bibs in tagged:
+                save_image_bibs(cursor, image_id, bibs)
+            if manifest_rows:
+                cursor.executemany("""
+                    INSERT OR REPLACE INTO TM_IngestManifest (FilePath, FileSize, MTime, ContentHash, ImageID)
+                    VALUES (?, ?, ?, ?, ?)
+                """, manifest_rows)
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        self._pending = []
+        self._pending_manifest = []
+        self._pending_deletes = []
+        self._last_flush = time.time()
+
+    def _has_table(self, cursor, name):
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,))
+        return cursor.fetchone() is not None
+
+    # Next free TM_Images.ID. AUTOINCREMENT never reuses the ID of a deleted row, neither do we.
+    def _next_image_id(self, cursor):
+        cursor.execute("SELECT COALESCE(MAX(ID), 0) FROM TM_Images")
+        max_id = cursor.fetchone()[0]
+        cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'TM_Images'")
+        row = cursor.fetchone()
+        return max(max_id, row[0] if row else 0) + 1
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,117 @@
+#====================================================================================
+# Author: Sara
+# Created on: 18 Oct 2026
+# Brief: In-memory FaceID -> image table used to resolve FAISS search hits without
+#        going to SQLite. Loaded together with the FAISS index and replaced whenever
+#        the index is reloaded.
+#        The table is also saved next to each published index generation as plain .npy
+#        files, which the API memory maps so all uvicorn workers share one copy.
+#        Lives next to dbconnector: written by ingestion (selfisearch), read by the server.
+#====================================================================================
+
+import os
+import shutil
+import sqlite3
+import numpy as np
+
+# Pack a list of strings into one UTF-8 buffer plus an offsets array (string i is
+# pool[offsets[i]:offsets[i + 1]]). Much smaller than a list of Python strings.
+def build_string_pool(strings):
+    encoded = [(s or "").encode("utf-8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+class FaceMetadataTable:
+    """Compact FaceID -> (ImageID, FileName, FilePath) lookup held in numpy arrays.
+
+    face_ids is sorted so a hit is resolved with one binary search.
+    face_image_rows points each face at its row in the image arrays.
+    """
+
+    # Array attributes, also the .npy file names of a saved table
+    ARRAYS = ("face_ids", "face_image_rows", "image_ids", "name_pool", "name_offsets", "path_pool", "path_offsets")
+
+    def __init__(self, face_ids, face_image_rows, image_ids, name_pool, name_offsets, path_pool, path_offsets):
+        self.face_ids = face_ids
+        self.face_image_rows = face_image_rows
+        self.image_ids = image_ids
+        self.name_pool = name_pool
+        self.name_offsets = name_offsets
+        self.path_pool = path_pool
+        self.path_offsets = path_offsets
+
+    @classmethod
+    def load(cls, db_path):
+        conn = sqlite3.connect(db_path)
+        cursor = conn.cursor()
+        cursor.execute("SELECT ID, FileName, FilePath FROM TM_Images ORDER BY ID")
+        images = cursor.fetchall()
+        cursor.execute("SELECT FaceID, ImageID FROM TM_Faces ORDER BY FaceID")
+        faces = cursor.fetchall()
+        conn.close()
+
+        image_ids = np.array([row[0] for row in images], dtype=np.int64)
+        name_pool, name_offsets = build_string_pool(row[1] for row in images)
+        path_pool, path_offsets = build_string_pool(row[2] for row in images)
+        face_ids = np.array([row[0] for row in faces], dtype=np.int64)
+        face_image_ids = np.array([row[1] for row in faces], dtype=np.int64)
+        face_image_rows = np.searchsorted(image_ids, face_image_ids)
+        # Faces whose image row is missing get -1
+        known = face_image_rows < len(image_ids)
+        known[known] = image_ids[face_image_rows[known]] == face_image_ids[known]
+        face_image_rows = np.where(known, face_image_rows, -1).astype(np.int64)
+        return cls(face_ids, face_image_rows, image_ids, name_pool, name_offsets, path_pool, path_offsets)
+
+    def save(self, folder):
+        """Write the arrays as <folder>/<name>.npy. Written to a temp folder and renamed,
+        so a reader never opens a half written table."""
+        tmp_folder = folder + ".tmp"
+        shutil.rmtree(tmp_folder, ignore_errors=True)
+        os.makedirs(tmp_folder)
+        for name in self.ARRAYS:
+            np.save(os.path.join(tmp_folder, name + ".npy"), getattr(self, name))
+        shutil.rmtree(folder, ignore_errors=True)
+        os.replace(tmp_folder, folder)
+
+    @classmethod
+    def open(cls, folder):
+        """Table saved by save(), memory mapped read only: pages come from the OS page
+        cache and are shared by every process that opens the same folder."""
+        return cls(*(np.load(os.path.join(folder, name + ".npy"), mmap_mode="r") for name in cls.ARRAYS))
+
+    def __len__(self):
+        return len(self.face_ids)
+
+    @property
+    def nbytes(self):
+        """Memory held by the table's arrays."""
+        return sum(getattr(self, name).nbytes for name in self.ARRAYS)
+
+    def _string(self, pool, offsets, row):
+        return pool[offsets[row]:offsets[row + 1]].tobytes().decode("utf-8")
+
+    def image_rows(self, face_ids):
+        """Vectorized FaceID -> image row, -1 for unknown FaceIDs."""
+        face_ids = np.asarray(face_ids, dtype=np.int64)
+        if len(self.face_ids) == 0:
+            return np.full(len(face_ids), -1, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self.face_ids, face_ids), len(self.face_ids) - 1)
+        return np.where(self.face_ids[pos] == face_ids, self.face_image_rows[pos], -1)
+
+    def image_row(self, face_id):
+        """Row in the image arrays for a FaceID, -1 if unknown."""
+        return int(self.image_rows([face_id])[0])
+
+    def image_info(self, row):
+        """(ImageID, FileName, FilePath) of an image row."""
+        return (int(self.image_ids[row]),
+                self._string(self.name_pool, self.name_offsets, row),
+                self._string(self.path_pool, self.path_offsets, row))
+
+    def lookup(self, face_id):
+        """Return (ImageID, FileName, FilePath) for a FaceID, or None if it is not known."""
+        row = self.image_row(face_id)
+        if row < 0:
+            return None
+        return self.image_info(row)
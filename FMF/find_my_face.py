@@ -22,6 +22,23 @@ def search_face(image_path):
     else:
         messagebox.showerror("Error", "Failed to search face")
 
+# Several reference photos go to the batch endpoint in one request
+def search_faces(image_paths):
+    files = [("files", open(path, 'rb')) for path in image_paths]
+    try:
+        response = requests.post(API_URL + "/batch", files=files)
+    finally:
+        for _, f in files:
+            f.close()
+    if response.status_code == 200:
+        results = []
+        for query in response.json().get("queries", []):
+            for face in query["faces"]:
+                results.extend(m for m in face["matches"] if isinstance(m, dict))
+        display_results(results)
+    else:
+        messagebox.showerror("Error", "Failed to search faces")
+
 def display_results(results):
     for widget in result_frame.winfo_children():
         widget.destroy()
@@ -29,13 +46,15 @@ def display_results(results):
         tk.Label(result_frame, text=f"{match['FileName']} (Distance: {match['Distance']:.2f})").pack()
 
 def select_image():
-    image_path = filedialog.askopenfilename(filetypes=[("Image Files", "*.jpg *.jpeg *.png")])
-    if image_path:
-        search_face(image_path)
+    image_paths = filedialog.askopenfilenames(filetypes=[("Image Files", "*.jpg *.jpeg *.png")])
+    if len(image_paths) == 1:
+        search_face(image_paths[0])
+    elif image_paths:
+        search_faces(image_paths)
 
 root = tk.Tk()
 root.title("Face Search")
-tk.Button(root, text="Select Selfie and Search", command=select_image).pack(pady=10)
+tk.Button(root, text="Select Selfies and Search", command=select_image).pack(pady=10)
 result_frame = tk.Frame(root)
 result_frame.pack(pady=10)
 root.mainloop()
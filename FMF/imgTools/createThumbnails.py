@@ -2,16 +2,21 @@
 # Author: Sara 
 # Created on: 10 Dec 2025
 # Brief: This script will creates scale down thumbnails for images for fast processing.
+#        Writes every width in THUMBNAIL_WIDTHS as JPEG and WebP, using all CPU cores.
+#        Thumbnails newer than their original are skipped, re-run it after adding images.
 #====================================================================================
 #
-import os
-import cv2
-from app.imgTools.imgTools import create_thumbnails
+import argparse
+from app.imgTools.imgTools import create_thumbnails, THUMBNAIL_WIDTHS, THUMBNAIL_FORMATS
 
 # Main sub 
 if __name__ == "__main__":
-    input_folder = r"C:\Work\FMF\Images\Downloads"
-    output_folder = r"C:\Work\FMF\Images\Downloads\Thumbnails"
-    create_thumbnails(input_folder, output_folder, size=(320,240))
+    parser = argparse.ArgumentParser(description="Create the thumbnails of the event images")
+    parser.add_argument("--input-folder", default=r"C:\Work\FMF\Images\Downloads")
+    parser.add_argument("--output-folder", default=r"C:\Work\FMF\Images\Downloads\Thumbnails")
+    parser.add_argument("--widths", type=int, nargs="+", default=list(THUMBNAIL_WIDTHS))
+    parser.add_argument("--formats", nargs="+", choices=THUMBNAIL_FORMATS, default=list(THUMBNAIL_FORMATS))
+    parser.add_argument("--workers", type=int, default=0, help="Worker processes (0 = one per CPU core)")
+    args = parser.parse_args()
 
-    
\ No newline at end of file
+    create_thumbnails(args.input_folder, args.output_folder, args.widths, args.formats, args.workers or None)
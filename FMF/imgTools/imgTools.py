@@ -3,12 +3,14 @@
 # Created on: 21 Nov 2025
 # Brief: This script basically a Utility bundled with all imaeg related tools.
 #====================================================================================
+import io
+import multiprocessing
 import numpy as np
 import os
+import time
 import boto3
-import cv2
 
-from PIL import Image
+from PIL import Image, ImageOps
 
 # Small funtion to resize image during face identification process for fast performance
 def resize_image(img_path, max_dim):
@@ -17,6 +19,51 @@ def resize_image(img_path, max_dim):
     img.thumbnail((max_dim, max_dim), Image.LANCZOS)
     return np.array(img)
 
+# In-memory version of resize_image for uploaded files: no temp file is written.
+# JPEGs are decoded in draft mode at the smallest DCT scale (1/2, 1/4, 1/8) that is still
+# at least max_dim, so a 12 MP phone selfie is never fully decoded just to be scaled
+# down. The EXIF orientation is applied in the same step so the face is upright.
+def decode_image_bytes(data, max_dim):
+    img = Image.open(io.BytesIO(data))
+    img.draft('RGB', (max_dim, max_dim))
+    img = ImageOps.exif_transpose(img).convert('RGB')
+    img.thumbnail((max_dim, max_dim), Image.LANCZOS)
+    return np.array(img)
+
+# Two resolution version of resize_image: decode once and return both the full resolution
+# RGB array and a copy scaled down to max_dim, plus the (y, x) factors that map
+# coordinates on the small copy back to the full resolution one.
+# Detect faces on the small copy, encode them from crops of the full one.
+def load_image_pyramid(img_path, max_dim):
+    return image_pyramid(Image.open(img_path).convert('RGB'), max_dim)
+
+# load_image_pyramid for an image that is already decoded (PIL RGB image)
+def image_pyramid(img, max_dim):
+    full = np.array(img)
+    small = img.copy()
+    small.thumbnail((max_dim, max_dim), Image.LANCZOS, reducing_gap=2.0)
+    scale = (img.height / small.height, img.width / small.width)
+    return full, np.array(small), scale
+
+# Map a (top, right, bottom, left) box from the small image to the full one, clamped to its size
+def scale_box(box, scale, shape):
+    top, right, bottom, left = box
+    sy, sx = scale
+    h, w = shape[:2]
+    return (max(0, int(top * sy)), min(w, int(round(right * sx))),
+            min(h, int(round(bottom * sy))), max(0, int(left * sx)))
+
+# Cut a (top, right, bottom, left) box out of an image with a margin around it.
+# Returns the crop and the box in crop coordinates.
+def crop_box(img, box, margin=0.25):
+    top, right, bottom, left = box
+    h, w = img.shape[:2]
+    my = int((bottom - top) * margin)
+    mx = int((right - left) * margin)
+    y1, y2 = max(0, top - my), min(h, bottom + my)
+    x1, x2 = max(0, left - mx), min(w, right + mx)
+    return img[y1:y2, x1:x2], (top - y1, right - x1, bottom - y1, left - x1)
+
 
 # Methods to deal with AWS S3 bucket
 
@@ -40,32 +87,127 @@ def upload_to_s3(local_path, s3_key):
         print(f"Error uploading {local_path} to s3://{bucket_name}/{s3_key}: {e}")
         raise
 
-def create_thumbnails(input_folder, output_folder, size=(320, 240)):
+# Thumbnails: one file per width and format in <output_folder>/w<width>/<name>.<format>.
+# The LEGACY_THUMBNAIL_WIDTH version is also written as <output_folder>/<original file name>,
+# which is what the API serves under /images/<file name>.
+THUMBNAIL_WIDTHS = (320, 640, 1024)
+THUMBNAIL_FORMATS = ("jpg", "webp")
+LEGACY_THUMBNAIL_WIDTH = 1024
+JPEG_QUALITY = 85
+WEBP_QUALITY = 80
+THUMBNAIL_PROGRESS_EVERY = 100
+
+# Path of the thumbnail of an original image for a width and format
+def thumbnail_path(output_folder, filename, width, fmt):
+    return os.path.join(output_folder, f"w{width}", os.path.splitext(filename)[0] + "." + fmt)
+
+# Open an image decoding JPEGs at the smallest DCT scale that still gives at least
+# min_width pixels across once the EXIF orientation is applied, then make it upright.
+def open_image_reduced(img_path, min_width):
+    img = Image.open(img_path)
+    raw_w, raw_h = img.size
+    # EXIF orientations 5-8 are rotated 90 degrees, their displayed width is the stored height
+    display_w = raw_h if img.getexif().get(0x0112, 1) in (5, 6, 7, 8) else raw_w
+    factor = min(1.0, min_width / float(display_w))
+    img.draft('RGB', (int(raw_w * factor + 0.5), int(raw_h * factor + 0.5)))
+    return ImageOps.exif_transpose(img).convert('RGB')
+
+def _save_thumbnail(img, out_path, fmt):
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    # Write next to the target and rename so the API never serves a half written file
+    tmp_path = out_path + ".tmp"
+    if fmt == "webp":
+        img.save(tmp_path, "WEBP", quality=WEBP_QUALITY, method=4)
+    elif fmt in ("jpg", "jpeg"):
+        img.save(tmp_path, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+    else:
+        img.save(tmp_path, Image.registered_extensions().get("." + fmt, "PNG"))
+    os.replace(tmp_path, out_path)
+
+# Thumbnails of an image that are missing or older than the image, as (path, width, format)
+def stale_thumbnails(img_path, output_folder, widths=THUMBNAIL_WIDTHS, formats=THUMBNAIL_FORMATS):
+    filename = os.path.basename(img_path)
+    outputs = [(thumbnail_path(output_folder, filename, w, fmt), w, fmt) for w in widths for fmt in formats]
+    if LEGACY_THUMBNAIL_WIDTH in widths:
+        outputs.append((os.path.join(output_folder, filename), LEGACY_THUMBNAIL_WIDTH,
+                        os.path.splitext(filename)[1].lower().lstrip(".")))
+    source_mtime = os.path.getmtime(img_path)
+    return [o for o in outputs if not os.path.exists(o[0]) or os.path.getmtime(o[0]) < source_mtime]
+
+# Create the missing or outdated thumbnails of one image (outputs older than the source are
+# rebuilt, newer ones are left alone). Returns the number of files written.
+def make_thumbnails(img_path, output_folder, widths=THUMBNAIL_WIDTHS, formats=THUMBNAIL_FORMATS):
+    stale = stale_thumbnails(img_path, output_folder, widths, formats)
+    if not stale:
+        return 0
+    return write_thumbnails(open_image_reduced(img_path, max(w for _, w, _ in stale)), stale)
+
+# Write the (path, width, format) thumbnails of an upright decoded PIL image
+def write_thumbnails(img, outputs):
+    resized = {}
+    for out_path, width, fmt in outputs:
+        if width not in resized:
+            # Never upscale images smaller than the requested width
+            w = min(width, img.width)
+            resized[width] = img if w == img.width else img.resize(
+                (w, max(1, round(img.height * w / img.width))), Image.LANCZOS, reducing_gap=2.0)
+        _save_thumbnail(resized[width], out_path, fmt)
+    return len(outputs)
+
+# Worker process: thumbnails of one image. Returns (file name, files written, error)
+def _thumbnail_worker(args):
+    img_path, output_folder, widths, formats = args
+    try:
+        return os.path.basename(img_path), make_thumbnails(img_path, output_folder, widths, formats), None
+    except Exception as e:
+        return os.path.basename(img_path), 0, str(e)
+
+def create_thumbnails(input_folder, output_folder, widths=THUMBNAIL_WIDTHS, formats=THUMBNAIL_FORMATS, workers=None):
     """
-    Create thumbnails for all images in a folder.
-    
+    Create thumbnails for all images in a folder, in a pool of worker processes.
+
+    Every image gets one thumbnail per width and format (see thumbnail_path), decoded at
+    reduced resolution. Thumbnails newer than their original are skipped, so re-running
+    on a folder only processes new or changed images.
+
     Args:
         input_folder (str): Path to the folder with original images.
         output_folder (str): Path to save thumbnails.
-        size (tuple): Desired thumbnail size (width, height).
+        widths (tuple): Thumbnail widths in pixels, the height keeps the aspect ratio.
+        formats (tuple): File formats to write ("jpg", "webp").
+        workers (int): Worker processes, default one per CPU core (1 = run in this process).
     """
     os.makedirs(output_folder, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    tasks = [(os.path.join(input_folder, filename), output_folder, tuple(widths), tuple(formats))
+             for filename in sorted(os.listdir(input_folder))
+             if filename.lower().endswith((".jpg", ".jpeg", ".png"))]
+    print(f"Creating thumbnails for {len(tasks)} images with {workers} workers")
 
-    for filename in os.listdir(input_folder):
-        if filename.lower().endswith((".jpg", ".jpeg", ".png")):
-            img_path = os.path.join(input_folder, filename)
-            img = cv2.imread(img_path)
-
-            if img is None:
-                print(f"Skipping {filename} (could not read)")
-                continue
-
-            # Resize to thumbnail size
-            # thumbnail = cv2.resize(img, size, interpolation=cv2.INTER_AREA)
-            thumbnail = cv2.resize(img, (1024, int(img.shape[0] * 1024 / img.shape[1])), interpolation=cv2.INTER_AREA)
-
-            # Save thumbnail
-            out_path = os.path.join(output_folder, filename)
-            cv2.imwrite(out_path, thumbnail)
+    pool = multiprocessing.Pool(workers) if workers > 1 else None
+    results = pool.imap_unordered(_thumbnail_worker, tasks, chunksize=4) if pool else map(_thumbnail_worker, tasks)
+    written = done = skipped = failed = 0
+    start = time.time()
+    try:
+        for filename, count, error in results:
+            done += 1
+            if error:
+                failed += 1
+                print(f"Skipping {filename} (could not read): {error}")
+            elif count == 0:
+                skipped += 1
+            written += count
+            if done % THUMBNAIL_PROGRESS_EVERY == 0:
+                print(f"[{done}/{len(tasks)}] {done / (time.time() - start):.1f} images/s")
+    except BaseException:
+        # Interrupted (Ctrl-C) or failed: stop the workers instead of waiting for the queued images
+        if pool:
+            pool.terminate()
+        raise
+    if pool:
+        pool.close()
+        pool.join()
 
-            print(f"Thumbnail saved: {out_path}")
\ No newline at end of file
+    elapsed = max(time.time() - start, 1e-9)
+    print(f"Thumbnails done: {written} files written, {skipped} images up to date, {failed} failed "
+          f"in {elapsed:.1f}s = {done / elapsed:.1f} images/s")
@@ -0,0 +1,163 @@
+#====================================================================================
+# Author: Sara
+# Created on: 18 Oct 2026
+# Brief: Packed thumbnail store. All thumbnails of the thumbnail folder are appended to
+#        one data file (thumbnails.pack) and a small offset index (thumbnails.pack.npz)
+#        maps each file name to its (offset, size, mtime). The API memory maps the pack
+#        and serves slices of it, instead of a stat + open per thumbnail file.
+#        Re-run after new thumbnails are created, only new or changed files are appended:
+#           python -m app.imgTools.thumbnail_pack <thumbnail folder>
+#        Replaced thumbnails leave their old bytes behind, --rebuild writes a fresh pack.
+#====================================================================================
+
+import argparse
+import mmap
+import os
+import sys
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+
+PACK_FILE = "thumbnails.pack"
+PACK_INDEX_FILE = "thumbnails.pack.npz"
+PACKED_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+
+# Looks like the os.stat_result fields used for ETag / Last-Modified
+PackedStat = namedtuple("PackedStat", ["st_size", "st_mtime_ns", "st_mtime"])
+
+def _encode_names(names):
+    encoded = [n.encode("utf-8") for n in names]
+    name_offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=name_offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), name_offsets
+
+def _decode_names(name_pool, name_offsets):
+    pool = name_pool.tobytes()
+    return [pool[name_offsets[i]:name_offsets[i + 1]].decode("utf-8") for i in range(len(name_offsets) - 1)]
+
+# {file name: (offset, size, mtime_ns)} of a pack, empty when there is none yet
+def read_pack_index(folder):
+    index_path = os.path.join(folder, PACK_INDEX_FILE)
+    if not os.path.exists(index_path):
+        return {}
+    with np.load(index_path) as data:
+        names = _decode_names(data["name_pool"], data["name_offsets"])
+        return {name: (int(o), int(s), int(m))
+                for name, o, s, m in zip(names, data["offsets"], data["sizes"], data["mtimes_ns"])}
+
+def _write_pack_index(folder, entries):
+    names = sorted(entries)
+    name_pool, name_offsets = _encode_names(names)
+    tmp_path = os.path.join(folder, PACK_INDEX_FILE + ".tmp.npz")
+    np.savez(tmp_path, name_pool=name_pool, name_offsets=name_offsets,
+             offsets=np.array([entries[n][0] for n in names], dtype=np.int64),
+             sizes=np.array([entries[n][1] for n in names], dtype=np.int64),
+             mtimes_ns=np.array([entries[n][2] for n in names], dtype=np.int64))
+    # Readers see either the old or the new index, never a partial one
+    os.replace(tmp_path, os.path.join(folder, PACK_INDEX_FILE))
+
+# Append the new or changed thumbnails of a folder to its pack. Only plain files of the
+# folder itself are packed (the /images/<file name> thumbnails). Returns the number appended.
+def pack_thumbnails(folder, rebuild=False):
+    pack_path = os.path.join(folder, PACK_FILE)
+    entries = {} if rebuild else read_pack_index(folder)
+    if rebuild and os.path.exists(pack_path):
+        os.remove(pack_path)
+
+    appended = 0
+    start = time.time()
+    with open(pack_path, "ab") as pack:
+        offset = pack.tell()
+        for entry in sorted(os.scandir(folder), key=lambda e: e.name):
+            if not entry.is_file() or not entry.name.lower().endswith(PACKED_EXTENSIONS):
+                continue
+            st = entry.stat()
+            known = entries.get(entry.name)
+            if known and known[1] == st.st_size and known[2] == st.st_mtime_ns:
+                continue
+            with open(entry.path, "rb") as f:
+                data = f.read()
+            pack.write(data)
+            entries[entry.name] = (offset, len(data), st.st_mtime_ns)
+            offset += len(data)
+            appended += 1
+        # Data must be on disk before the index points at it
+        pack.flush()
+        os.fsync(pack.fileno())
+    _write_pack_index(folder, entries)
+    print(f"Packed {appended} thumbnails ({len(entries)} in pack, {offset / 1e6:.1f} MB) "
+          f"in {time.time() - start:.1f}s")
+    return appended
+
+class ThumbnailPack:
+    """Read side of a pack: memory mapped data + in-memory index, reloaded when the pack is updated."""
+
+    def __init__(self, folder, check_every_secs=5.0):
+        self.folder = folder
+        self.check_every_secs = check_every_secs
+        self._lock = threading.Lock()
+        self._last_check = 0.0
+        self._index_mtime = None
+        # (entries, mmap) swapped as one so readers never mix an old map with a new index
+        self._state = ({}, None)
+        self.refresh_if_changed()
+
+    @staticmethod
+    def exists(folder):
+        return os.path.exists(os.path.join(folder, PACK_INDEX_FILE))
+
+    def refresh_if_changed(self):
+        """Re-map the pack when its index was rewritten, checked at most every check_every_secs."""
+        now = time.time()
+        if now - self._last_check < self.check_every_secs:
+            return
+        self._last_check = now
+        try:
+            index_mtime = os.stat(os.path.join(self.folder, PACK_INDEX_FILE)).st_mtime_ns
+        except OSError:
+            return
+        if index_mtime == self._index_mtime:
+            return
+        with self._lock:
+            try:
+                entries = read_pack_index(self.folder)
+                with open(os.path.join(self.folder, PACK_FILE), "rb") as f:
+                    data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else None
+            except OSError as e:
+                # Pack being rewritten (--rebuild), retried on the next check
+                print(f"Could not open the thumbnail pack of {self.folder}: {e}")
+                return
+            # The old map stays valid for slices already handed out, it is freed with them
+            self._state, self._index_mtime = (entries, data), index_mtime
+
+    def stat(self, filename):
+        """PackedStat of a packed thumbnail, None when it is not packed."""
+        self.refresh_if_changed()
+        entry = self._state[0].get(filename)
+        if entry is None:
+            return None
+        return PackedStat(entry[1], entry[2], entry[2] / 1e9)
+
+    def get(self, filename):
+        """(memoryview of the thumbnail bytes, PackedStat) or None when it is not packed."""
+        self.refresh_if_changed()
+        entries, data = self._state
+        entry = entries.get(filename)
+        if entry is None or data is None:
+            return None
+        offset, size, mtime_ns = entry
+        return memoryview(data)[offset:offset + size], PackedStat(size, mtime_ns, mtime_ns / 1e9)
+
+    def __len__(self):
+        return len(self._state[0])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pack the thumbnails of a folder into one file")
+    parser.add_argument("folder", nargs="?", default=r"C:\Work\FMF\Images\Downloads\Thumbnails")
+    parser.add_argument("--rebuild", action="store_true", help="Write a fresh pack (drops replaced thumbnails)")
+    args = parser.parse_args()
+    if not os.path.isdir(args.folder):
+        sys.exit(f"No such folder {args.folder}")
+    pack_thumbnails(args.folder, args.rebuild)
@@ -0,0 +1,160 @@
+#====================================================================================
+# Author: Sara
+# Created on: 18 Oct 2026
+# Brief: One pass ingestion of an event folder: every new or changed image is read
+#        and decoded once, and the pixels are handed to the face, bib OCR and
+#        thumbnail stages. Faces, face boxes and bibs of a batch of images are written
+#        in one DB transaction (ImageDBWriter), then the FAISS index is built/updated.
+#        Replaces running process_images, tagImages_Using_easyOCR and createThumbnails
+#        one after the other:
+#           python -m app.ingest_event --folder <images> --thumbnail-folder <thumbnails>
+# Precondition :
+#   1 - Create a folder and place all images to be processed in it
+#====================================================================================
+
+import argparse
+import multiprocessing as mp
+import os
+import threading
+import time
+import cv2
+import numpy as np
+
+from PIL import Image, ImageOps
+
+from app.dbconnector import LOCAL_IMAGE_FOLDER, local_db_path, init_db, ImageDBWriter, file_content_hash
+from app.imgTools.imgTools import stale_thumbnails, write_thumbnails
+from app.selfisearch.process_images import encode_image_faces, build_faiss_index, update_faiss_index
+from app.selfisearch.process_images import plan_tasks, feed_tasks, run_worker, worker_slots, collect_results
+from app.selfisearch.process_images import QUEUE_DEPTH_PER_WORKER, PROGRESS_EVERY_SECS
+from app.selfisearch.face_index import INDEX_TYPES
+
+DEFAULT_THUMBNAIL_FOLDER = os.path.join(LOCAL_IMAGE_FOLDER, "Downloads", "Thumbnails")
+
+# Decode one image and run every stage on it.
+# Returns (content hash, faces, bibs, thumbnails written). faces is a list of (encoding, box)
+# and is None, like bibs, when the content is unchanged since the previous run.
+# bibs is None when OCR is off; thumbnail_folder None skips the thumbnails.
+def ingest_image(task, detect_dim=None, ocr=True, thumbnail_folder=None):
+    img_path, size, mtime, previous = task
+    file_hash = file_content_hash(img_path)
+    if previous and previous[2] == file_hash:
+        return file_hash, None, None, 0
+
+    # The only decode of the image, full resolution in the stored frame
+    img = Image.open(img_path)
+    img.load()
+    rgb = img.convert('RGB')
+
+    faces = encode_image_faces(rgb, detect_dim)
+    bibs = None
+    if ocr:
+        # Imported here so --no-ocr runs without easyocr installed
+        from app.bibSearch.tagImages_Using_easyOCR import extract_bibs_from_image
+        # OCR the torso below each face (whole frame when there is none), same as tagImages_Using_easyOCR --face-roi
+        bibs = extract_bibs_from_image(cv2.cvtColor(np.asarray(rgb), cv2.COLOR_RGB2BGR), [box for _, box in faces])
+    thumbnails = 0
+    if thumbnail_folder:
+        stale = stale_thumbnails(img_path, thumbnail_folder)
+        if stale:
+            # Thumbnails are shown upright, EXIF orientation taken from the original
+            thumbnails = write_thumbnails(ImageOps.exif_transpose(img).convert('RGB'), stale)
+    return file_hash, faces, bibs, thumbnails
+
+# Queue the result of one image on the writer. Images with faces or bibs are stored,
+# every processed file goes into the manifest so a re-run skips it.
+def _store_result(writer, task, file_hash, faces, bibs):
+    img_path, size, mtime, previous = task
+    file_info = (size, mtime, file_hash)
+    previous_image_id = previous[3] if previous else None
+    if faces is None:
+        writer.add_manifest(img_path, file_info, image_id=previous_image_id)
+    elif faces or bibs:
+        writer.add(os.path.basename(img_path), img_path, [enc for enc, _ in faces], file_info,
+                   replaces_image_id=previous_image_id, face_boxes=[box for _, box in faces], bibs=bibs)
+    else:
+        writer.add_manifest(img_path, file_info, replaces_image_id=previous_image_id)
+
+# Ingest every new or changed image of the folder with workers processes (1 = in this process)
+def ingest_event(folder_path, workers=1, detect_dim=None, ocr=True, thumbnail_folder=DEFAULT_THUMBNAIL_FOLDER):
+    with ImageDBWriter(local_db_path) as writer:
+        tasks, skipped = plan_tasks(folder_path, writer.load_manifest())
+        total = len(tasks)
+        print(f"Ingesting {total} images with {workers} workers, {skipped} unchanged images skipped")
+
+        procs = []
+        if workers > 1:
+            task_queue = mp.Queue(maxsize=workers * QUEUE_DEPTH_PER_WORKER)
+            result_queue = mp.Queue(maxsize=workers * QUEUE_DEPTH_PER_WORKER)
+            current = worker_slots(workers)
+            procs = [mp.Process(target=run_worker,
+                                args=(wid, task_queue, result_queue, current, ingest_image,
+                                      (detect_dim, ocr, thumbnail_folder)), daemon=True)
+                     for wid in range(workers)]
+            for p in procs:
+                p.start()
+            threading.Thread(target=feed_tasks, args=(enumerate(tasks), task_queue, workers), daemon=True).start()
+            results = (result[1:] for result in collect_results(procs, result_queue, current, tasks))
+        else:
+            def serial_results():
+                for task in tasks:
+                    try:
+                        yield task, ingest_image(task, detect_dim, ocr, thumbnail_folder), None
+                    except Exception as e:
+                        yield task, None, str(e)
+            results = serial_results()
+
+        done = faces = tagged = thumbnails = failed = 0
+        start = last_report = time.time()
+        for task, result, error in results:
+            done += 1
+            if error:
+                failed += 1
+                print(f"Failed to ingest {os.path.basename(task[0])}: {error}")
+            else:
+                file_hash, image_faces, bibs, image_thumbnails = result
+                _store_result(writer, task, file_hash, image_faces, bibs)
+                faces += len(image_faces or [])
+                tagged += 1 if bibs else 0
+                thumbnails += image_thumbnails
+
+            now = time.time()
+            if now - last_report >= PROGRESS_EVERY_SECS:
+                last_report = now
+                print(f"[{done}/{total}] {done / (now - start):.1f} images/s, {faces} faces, "
+                      f"{tagged} images with bibs, {thumbnails} thumbnails")
+
+    for p in procs:
+        p.join()
+    if procs and done < total:
+        # Lost with crashed workers: left for the next run (resumed through the manifest)
+        print(f"{total - done} images not ingested, run again to ingest them")
+        task_queue.cancel_join_thread()
+    elapsed = max(time.time() - start, 1e-9)
+    print(f"Ingested {done} images ({failed} failed): {faces} faces, {tagged} images with bibs, "
+          f"{thumbnails} thumbnails in {elapsed:.1f}s = {done / elapsed:.1f} images/s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest an event folder: faces, bibs and thumbnails in one pass")
+    parser.add_argument("--folder", default=LOCAL_IMAGE_FOLDER, help="Folder with the images to process")
+    parser.add_argument("--thumbnail-folder", default=DEFAULT_THUMBNAIL_FOLDER, help="Folder to write thumbnails to")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of worker processes (default 1 = serial, 0 = one per CPU core)")
+    parser.add_argument("--detect-dim", type=int, default=0,
+                        help="Two resolution mode: detect faces at this size, encode them from the full resolution image")
+    parser.add_argument("--no-ocr", action="store_true", help="Skip bib OCR (tag later with tagImages_Using_easyOCR)")
+    parser.add_argument("--no-thumbnails", action="store_true", help="Skip thumbnail generation")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Append the new faces to the existing FAISS index instead of rebuilding it")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default="flat",
+                        help="FAISS index type used on a full rebuild (see face_index.py to compare them)")
+    args = parser.parse_args()
+
+    init_db()
+    ingest_event(args.folder, workers=args.workers if args.workers > 0 else (os.cpu_count() or 1),
+                 detect_dim=args.detect_dim or None, ocr=not args.no_ocr,
+                 thumbnail_folder=None if args.no_thumbnails else args.thumbnail_folder)
+    if args.incremental:
+        update_faiss_index()
+    else:
+        build_faiss_index(args.index_type)
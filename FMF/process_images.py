@@ -13,6 +13,7 @@ import pickle
 import face_recognition
 
 from PIL import Image
+from app.dbconnector import ImageDBWriter, load_embeddings
 # Used for resizing images
 MAX_DIM = 800
 
@@ -63,34 +64,32 @@ def resize_image(img_path, max_dim=MAX_DIM):
     img = Image.open(img_path).convert('RGB')
     img.thumbnail((max_dim, max_dim), Image.LANCZOS)
     return np.array(img)
-# function to store the images and face idendified in the image to a db tables   
-def store_image_and_faces(file_name, file_path, face_embeddings):
-    # Store image and its face embeddings in DB
-    conn = sqlite3.connect(local_db_path)
-    cursor = conn.cursor()
-    cursor.execute("INSERT INTO TM_Images (FileName, FilePath) VALUES (?, ?)", (file_name, file_path))
-    image_id = cursor.lastrowid
-    for emb in face_embeddings:
-        cursor.execute("INSERT INTO TM_Faces (ImageID, Embedding) VALUES (?, ?)", (image_id, pickle.dumps(emb)))
-    conn.commit()
-    conn.close()
+# function to store the images and face idendified in the image to a db tables
+# Pass the writer of the current run so rows are committed in batches on one connection
+def store_image_and_faces(file_name, file_path, face_embeddings, writer=None):
+    if writer is None:
+        with ImageDBWriter(local_db_path, event_id=None) as single_writer:
+            single_writer.add(file_name, file_path, face_embeddings)
+        return
+    writer.add(file_name, file_path, face_embeddings)
 
 # Main function which loops through the  image folder and process each image
 def process_images(folder_path):
     # Detect faces and store embeddings. Images are resized before encoding
-    for file in os.listdir(folder_path):
-        if file.lower().endswith(('.png', '.jpg', '.jpeg')):
-            img_path = os.path.join(folder_path, file)
-            try:
-                img_small = resize_image(img_path, MAX_DIM)
-            except Exception as e:
-                print(f"Failed to open/resize {file}: {e}")
-                continue
-            # If multipe faces adentified in the image will return the list of face encodings
-            face_encodings = face_recognition.face_encodings(img_small)
-            if face_encodings:
-                store_image_and_faces(file, img_path, face_encodings)
-                print(f"Processed {file}: {len(face_encodings)} faces (resized to max {MAX_DIM}px)")
+    with ImageDBWriter(local_db_path, event_id=None) as writer:
+        for file in os.listdir(folder_path):
+            if file.lower().endswith(('.png', '.jpg', '.jpeg')):
+                img_path = os.path.join(folder_path, file)
+                try:
+                    img_small = resize_image(img_path, MAX_DIM)
+                except Exception as e:
+                    print(f"Failed to open/resize {file}: {e}")
+                    continue
+                # If multipe faces adentified in the image will return the list of face encodings
+                face_encodings = face_recognition.face_encodings(img_small)
+                if face_encodings:
+                    store_image_and_faces(file, img_path, face_encodings, writer)
+                    print(f"Processed {file}: {len(face_encodings)} faces (resized to max {MAX_DIM}px)")
 
 def build_faiss_index():
     # Build FAISS, Face book AI Simalirit Search index from face embeddings in DB for fast and quick access during search
@@ -100,14 +99,9 @@ def build_faiss_index():
     rows = cursor.fetchall()
     conn.close()
 
-    face_ids = []
-    embeddings = []
-
-    for face_id, emb_blob in rows:
-        face_ids.append(face_id)
-        embeddings.append(pickle.loads(emb_blob))
-
-    embeddings = np.array(embeddings).astype('float32')
+    # One vectorized read of all float32 embedding BLOBs
+    face_ids, embeddings = load_embeddings(rows)
+    face_ids = face_ids.tolist()
 
     # Create FAISS index
     dim = embeddings.shape[1]
@@ -0,0 +1,246 @@
+#====================================================================================
+# Author: Sara
+# Created on: 18 Oct 2026
+# Brief: FAISS index factory for the face embeddings of an event.
+#        Supports exact (Flat) and approximate (IVF-Flat, IVF-PQ, HNSW) indexes, all
+#        wrapped in an ID map so search results are TM_Faces.FaceID values.
+#        Run this script to compare an index type against the exact Flat index:
+#           python -m app.selfisearch.face_index --type ivf-pq --nprobe 16
+#        It reports recall@k against Flat and p50/p99 single query latency.
+#====================================================================================
+
+import argparse
+import os
+import shutil
+import sqlite3
+import sys
+import time
+import numpy as np
+import faiss
+
+# Add parent directory to path to enable imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from app.dbconnector import local_db_path, load_embeddings, EMBEDDING_DIM
+from app.face_metadata import FaceMetadataTable
+
+INDEX_TYPES = ("flat", "ivf-flat", "ivf-pq", "hnsw")
+
+# Default tuning values. nlist = 0 picks ~4 * sqrt(number of faces)
+DEFAULT_NLIST = 0
+DEFAULT_NPROBE = 16
+DEFAULT_PQ_M = 16          # PQ sub-quantizers, 128 dims / 16 = 8 dims each -> 16 bytes per face
+DEFAULT_HNSW_M = 32
+DEFAULT_EF_SEARCH = 64
+TRAIN_SAMPLE_SIZE = 100000
+
+# FAISS wants ~39 training points per centroid; PQ always has 256 centroids per sub-quantizer
+MIN_POINTS_PER_CENTROID = 39
+PQ_CENTROIDS = 256
+
+def _pick_nlist(num_faces, nlist):
+    if not nlist:
+        nlist = int(4 * np.sqrt(max(num_faces, 1)))
+    return max(1, min(nlist, num_faces // MIN_POINTS_PER_CENTROID))
+
+# Create an empty (untrained) ID-mapped index of the requested type for num_faces vectors.
+# Falls back to Flat when there are too few faces to train an approximate index.
+def create_index(index_type="flat", num_faces=0, dim=EMBEDDING_DIM, nlist=DEFAULT_NLIST,
+                 pq_m=DEFAULT_PQ_M, hnsw_m=DEFAULT_HNSW_M):
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}', expected one of {INDEX_TYPES}")
+    if index_type in ("ivf-flat", "ivf-pq") and num_faces < PQ_CENTROIDS:
+        print(f"Only {num_faces} faces, too few to train {index_type}. Using flat index.")
+        index_type = "flat"
+
+    if index_type == "flat":
+        description = "IDMap2,Flat"
+    elif index_type == "ivf-flat":
+        description = f"IDMap2,IVF{_pick_nlist(num_faces, nlist)},Flat"
+    elif index_type == "ivf-pq":
+        description = f"IDMap2,IVF{_pick_nlist(num_faces, nlist)},PQ{pq_m}"
+    else:
+        description = f"IDMap2,HNSW{hnsw_m}"
+    return faiss.index_factory(dim, description, faiss.METRIC_L2)
+
+# Train the index (IVF / PQ only) on a random sample of the embeddings
+def train_index(index, embeddings, sample_size=TRAIN_SAMPLE_SIZE):
+    if index.is_trained:
+        return index
+    if len(embeddings) > sample_size:
+        rng = np.random.default_rng(0)
+        embeddings = embeddings[rng.choice(len(embeddings), sample_size, replace=False)]
+    index.train(np.ascontiguousarray(embeddings))
+    return index
+
+# Set query time parameters. They are saved with the index by faiss.write_index.
+# nprobe applies to IVF indexes, ef_search to HNSW; parameters that do not apply are ignored.
+def set_search_params(index, nprobe=None, ef_search=None):
+    params = faiss.ParameterSpace()
+    inner = faiss.downcast_index(index.index) if hasattr(index, "id_map") else index
+    if nprobe and isinstance(inner, faiss.IndexIVF):
+        params.set_index_parameter(index, "nprobe", nprobe)
+    if ef_search and isinstance(inner, faiss.IndexHNSW):
+        params.set_index_parameter(index, "efSearch", ef_search)
+    return index
+
+# Create, train and fill an index from FaceIDs and their embeddings
+def build_index(face_ids, embeddings, index_type="flat", nlist=DEFAULT_NLIST, nprobe=DEFAULT_NPROBE,
+                pq_m=DEFAULT_PQ_M, hnsw_m=DEFAULT_HNSW_M, ef_search=DEFAULT_EF_SEARCH):
+    index = create_index(index_type, len(face_ids), embeddings.shape[1], nlist, pq_m, hnsw_m)
+    train_index(index, embeddings)
+    set_search_params(index, nprobe, ef_search)
+    index.add_with_ids(embeddings, face_ids)
+    return index
+
+# Readers (the API server) watch <index path>.generation, a counter bumped every time a new
+# index is published, and reload the index when it changes.
+GENERATION_SUFFIX = ".generation"
+
+def _replace_file(tmp_path, path):
+    # fsync before the rename so a crash never leaves a renamed but empty file
+    with open(tmp_path, "rb+") as f:
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def read_index_generation(index_path):
+    """Generation of the index published at index_path, 0 when none was published yet."""
+    try:
+        with open(index_path + GENERATION_SUFFIX) as f:
+            return int(f.read().strip() or 0)
+    except (OSError, ValueError):
+        return 0
+
+# Every generation is written to a file of its own, <index path>.<generation>. The API keeps
+# the current one memory mapped and a mapped file cannot be replaced on Windows, so a new
+# generation never overwrites the file of the previous one.
+def generation_index_path(index_path, generation):
+    return f"{index_path}.{generation}"
+
+# FaceID -> image table of a generation, saved by publish_index as memory mappable .npy files
+def metadata_path(index_path, generation):
+    return f"{index_path}.meta.{generation}"
+
+def published_index(index_path):
+    """(generation, file) of the current index. The file is index_path itself for an index
+    written before generations had their own file, None when there is no index at all."""
+    generation = read_index_generation(index_path)
+    for path in (generation_index_path(index_path, generation), index_path):
+        if os.path.exists(path):
+            return generation, path
+    return generation, None
+
+# Remove the index files and metadata of generations older than keep_from, and the index
+# file written before generations had their own file. Processes still mapping them keep
+# their pages (POSIX); where the OS refuses to delete a mapped file it is retried next publish.
+def _remove_old_generations(index_path, keep_from):
+    folder, base = os.path.split(index_path)
+    folder = folder or "."
+    for name in os.listdir(folder):
+        if not name.startswith(base + "."):
+            continue
+        suffix = name[len(base) + 1:]
+        generation = suffix[len("meta."):] if suffix.startswith("meta.") else suffix
+        if not generation.isdigit() or int(generation) >= keep_from:
+            continue
+        path = os.path.join(folder, name)
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    try:
+        os.remove(index_path)
+    except OSError:
+        pass
+
+# Write an index as a new generation: written to a temp file and renamed to the file of the
+# generation, so a reader never opens a half written index, then the generation marker is
+# bumped. With db_path the FaceID -> image table of the DB is saved for the generation first.
+# Files older than the previous generation are removed. Returns the new generation.
+def publish_index(index, index_path, db_path=None):
+    generation = read_index_generation(index_path) + 1
+    if db_path:
+        FaceMetadataTable.load(db_path).save(metadata_path(index_path, generation))
+    path = generation_index_path(index_path, generation)
+    faiss.write_index(index, path + ".tmp")
+    _replace_file(path + ".tmp", path)
+    with open(index_path + GENERATION_SUFFIX + ".tmp", "w") as f:
+        f.write(str(generation))
+    _replace_file(index_path + GENERATION_SUFFIX + ".tmp", index_path + GENERATION_SUFFIX)
+    _remove_old_generations(index_path, generation - 1)
+    return generation
+
+# Read an index for searching only. The vectors stay in the memory mapped file (page cache)
+# instead of a private copy, so every process serving the same index shares them and
+# loading is near instant. Falls back to a normal read where FAISS cannot map the index.
+def read_index_shared(index_path):
+    mmap_flag = getattr(faiss, "IO_FLAG_MMAP_IFC", None) or getattr(faiss, "IO_FLAG_MMAP", None)
+    if mmap_flag:
+        try:
+            return faiss.read_index(index_path, mmap_flag | getattr(faiss, "IO_FLAG_READ_ONLY", 0))
+        except RuntimeError as e:
+            print(f"Memory mapping {index_path} failed, reading it into memory: {e}")
+    return faiss.read_index(index_path)
+
+# Compare an index against exact search on the same data.
+# Returns recall@k (share of the exact top k found) and single query latency in ms.
+def evaluate_index(index, embeddings, k=5, num_queries=1000):
+    rng = np.random.default_rng(1)
+    queries = embeddings[rng.choice(len(embeddings), min(num_queries, len(embeddings)), replace=False)]
+
+    exact = faiss.IndexFlatL2(embeddings.shape[1])
+    exact.add(embeddings)
+    _, exact_rows = exact.search(queries, k)
+    # Map exact results (row positions) to the ids the evaluated index returns
+    ids = faiss.vector_to_array(index.id_map) if hasattr(index, "id_map") else np.arange(index.ntotal)
+    exact_ids = ids[exact_rows]
+
+    latencies = []
+    hits = 0
+    for qi in range(len(queries)):
+        start = time.perf_counter()
+        _, found = index.search(queries[qi:qi + 1], k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits += len(np.intersect1d(found[0], exact_ids[qi]))
+
+    return {
+        "recall_at_k": hits / float(len(queries) * k),
+        "k": k,
+        "queries": len(queries),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+    }
+
+def load_event_embeddings(db_path=local_db_path):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute("SELECT FaceID, Embedding FROM TM_Faces")
+    rows = cursor.fetchall()
+    conn.close()
+    return load_embeddings(rows)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report recall@k and latency of a FAISS index type")
+    parser.add_argument("--type", choices=INDEX_TYPES, nargs="+", default=list(INDEX_TYPES))
+    parser.add_argument("--nlist", type=int, default=DEFAULT_NLIST)
+    parser.add_argument("--nprobe", type=int, default=DEFAULT_NPROBE)
+    parser.add_argument("--pq-m", type=int, default=DEFAULT_PQ_M)
+    parser.add_argument("--hnsw-m", type=int, default=DEFAULT_HNSW_M)
+    parser.add_argument("--ef-search", type=int, default=DEFAULT_EF_SEARCH)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=1000)
+    args = parser.parse_args()
+
+    face_ids, embeddings = load_event_embeddings()
+    print(f"Loaded {len(face_ids)} faces from {local_db_path}")
+    for index_type in args.type:
+        start = time.perf_counter()
+        index = build_index(face_ids, embeddings, index_type, args.nlist, args.nprobe,
+                            args.pq_m, args.hnsw_m, args.ef_search)
+        build_secs = time.perf_counter() - start
+        report = evaluate_index(index, embeddings, args.k, args.queries)
+        print(f"{index_type:9s} build {build_secs:6.2f}s  recall@{report['k']} {report['recall_at_k']:.3f}  "
+              f"p50 {report['p50_ms']:.3f} ms  p99 {report['p99_ms']:.3f} ms")
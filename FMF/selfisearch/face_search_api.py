@@ -14,13 +14,13 @@ import uvicorn
 import os
 import sqlite3
 import faiss
-import pickle
 import numpy as np
 import face_recognition
 
 from app.imgTools.imgTools import resize_image
 from PIL import Image
-from app.dbconnector import local_db_path, local_index_path, local_meta_path, LOCAL_IMAGE_FOLDER
+from app.dbconnector import local_db_path, local_index_path, LOCAL_IMAGE_FOLDER
+from app.selfisearch.face_index import published_index
 
 # Used for resizing images
 MAX_DIM = 800
@@ -28,9 +28,8 @@ MAX_DIM = 800
 # Distance threshold: only return matches with distance <= this value
 DISTANCE_THRESHOLD = 0.19
 
-index = faiss.read_index(local_index_path)
-with open(local_meta_path, 'rb') as f:
-    face_ids = pickle.load(f)
+# The index is ID-mapped: search returns TM_Faces.FaceID values directly
+index = faiss.read_index(published_index(local_index_path)[1])
 
 app = FastAPI(title="Face Search API")
 
@@ -71,11 +70,11 @@ async def search_face(file: UploadFile = File(...), top_k: int = 5):
     for face_emb in uploaded_faces:
         face_emb = np.expand_dims(face_emb.astype('float32'), axis=0)
         distances, indices = index.search(face_emb, top_k)
-        for j, i in enumerate(indices[0]):
+        for j, matched_face_id in enumerate(indices[0]):
             dist = float(distances[0][j])
-            # only include matches at or below the threshold
-            if dist <= DISTANCE_THRESHOLD:
-                matched_face_id = face_ids[i]
+            # only include matches at or below the threshold (-1 means fewer than top_k faces indexed)
+            if matched_face_id >= 0 and dist <= DISTANCE_THRESHOLD:
+                matched_face_id = int(matched_face_id)
                 conn = sqlite3.connect(local_db_path)
                 cursor = conn.cursor()
                 cursor.execute("""
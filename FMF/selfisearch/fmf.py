@@ -4,32 +4,27 @@ import numpy as np
 from PIL import Image
 import face_recognition
 import faiss
-import pickle
 
+from app.dbconnector import local_db_path, local_index_path
+from app.selfisearch.face_index import published_index
 
-local_db_folder = r"C:\Work\FMF\DB"  # Local folder to store DB
+# Index published by process_images / ingest_event (ID mapped: search hits are TM_Faces.FaceID
+# values) and the FaceID -> (FileName, FilePath) table, both read once and read again together
+# when a new index generation is published
+index = None
+_index_version = None
+_metadata = None
 
-# Local file names
-DB_FILE = "ImageDB.sqlite"
-INDEX_FILE = "faiss_face_index.bin"
-META_FILE = "face_metadata.pkl"
-
-# Full local paths
-local_db_path = os.path.join(local_db_folder, DB_FILE)
-local_index_path = os.path.join(local_db_folder, INDEX_FILE)
-local_meta_path = os.path.join(local_db_folder, META_FILE)
-
-
-# load index and metadata once
-if os.path.exists(local_index_path):
-    index = faiss.read_index(local_index_path)
-else:
-    index = faiss.IndexFlatL2(128)
-if os.path.exists(local_meta_path):
-    with open(local_meta_path, "rb") as f:
-        face_ids = pickle.load(f)
-else:
-    face_ids = []
+def load_index():
+    """Return the FAISS index, reloading it and the metadata when a new index was published."""
+    global index, _index_version
+    _, index_file = published_index(local_index_path)
+    version = (index_file, os.path.getmtime(index_file)) if index_file else None
+    if index is None or version != _index_version:
+        index = faiss.read_index(index_file) if index_file else faiss.IndexIDMap2(faiss.IndexFlatL2(128))
+        _index_version = version
+        preload_metadata(refresh=True)
+    return index
 
 def load_and_resize_image(path, max_dim=800):
     """Load image with PIL and downscale while preserving aspect ratio."""
@@ -40,8 +35,12 @@ def load_and_resize_image(path, max_dim=800):
         img = img.resize((int(w * scale), int(h * scale)), Image.LANCZOS)
     return np.array(img)
 
-def preload_metadata():
-    """Return mapping FaceID -> (FileName, FilePath) to avoid DB queries inside loop."""
+def preload_metadata(refresh=False):
+    """Return mapping FaceID -> (FileName, FilePath) to avoid DB queries inside loop.
+    The table is read once; load_index refreshes it whenever it loads a rebuilt index."""
+    global _metadata
+    if _metadata is not None and not refresh:
+        return _metadata
     conn = sqlite3.connect(local_db_path)
     cur = conn.cursor()
     cur.execute("""
@@ -49,9 +48,9 @@ def preload_metadata():
         FROM TM_Faces
         JOIN TM_Images ON TM_Faces.ImageID = TM_Images.ID
     """)
-    meta = {row[0]: (row[1], row[2]) for row in cur.fetchall()}
+    _metadata = {row[0]: (row[1], row[2]) for row in cur.fetchall()}
     conn.close()
-    return meta
+    return _metadata
 
 def find_my_face(image_path, top_k=3, max_dim=800):
     # 1) Load & downscale to reduce CPU/time for detection/encoding
@@ -69,21 +68,20 @@ def find_my_face(image_path, top_k=3, max_dim=800):
 
     # 4) Batch query FAISS (convert to float32)
     queries = np.vstack([e.astype("float32") for e in encodings])
-    k = min(top_k, max(1, int(index.ntotal)))
-    distances, indices = index.search(queries, k)
+    current_index = load_index()
+    k = min(top_k, max(1, int(current_index.ntotal)))
+    distances, face_ids = current_index.search(queries, k)
 
-    # 5) Map indices -> face_ids -> metadata, using a preloaded map
+    # 5) Map FaceIDs -> metadata, using the preloaded map
     meta = preload_metadata()
     results = []
     for qi in range(len(encodings)):
         matches = []
-        for nbr_rank, idx in enumerate(indices[qi]):
-            if idx < 0 or idx >= len(face_ids):
-                continue
-            fid = face_ids[idx]
-            if fid not in meta:
+        for nbr_rank, fid in enumerate(face_ids[qi]):
+            # -1 when fewer than k faces are indexed
+            if fid < 0 or int(fid) not in meta:
                 continue
-            filename, filepath = meta[fid]
+            filename, filepath = meta[int(fid)]
             matches.append({
                 "rank": nbr_rank,
                 "FileName": filename,
@@ -0,0 +1,70 @@
+#====================================================================================
+# Author: Sara
+# Created on: 18 Oct 2026
+# Brief: One-shot migration of TM_Faces.Embedding from pickled float64 numpy arrays
+#        to raw little-endian float32 bytes (512 bytes per face).
+#        Converts every *_ImageDB.sqlite file in the local DB folder. Rows that are
+#        already float32 are left alone, so it is safe to run more than once.
+# Precondition :
+#   1 - Stop ingestion / API server for the event DBs being migrated
+#   2 - Rebuild the FAISS index afterwards (process_images.build_faiss_index)
+#====================================================================================
+
+import glob
+import os
+import pickle
+import sqlite3
+import sys
+
+# Add parent directory to path to enable imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from app.dbconnector import local_db_folder, embedding_to_blob, EMBEDDING_BLOB_SIZE
+
+# Number of faces converted per transaction
+BATCH_SIZE = 5000
+
+def migrate_db(db_path):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM TM_Faces WHERE length(Embedding) != ?", (EMBEDDING_BLOB_SIZE,))
+    pending = cursor.fetchone()[0]
+    if not pending:
+        conn.close()
+        print(f"{os.path.basename(db_path)}: already float32")
+        return 0
+
+    size_before = os.path.getsize(db_path)
+    converted = 0
+    last_id = 0
+    while True:
+        cursor.execute("""
+            SELECT FaceID, Embedding FROM TM_Faces
+            WHERE length(Embedding) != ? AND FaceID > ?
+            ORDER BY FaceID LIMIT ?
+        """, (EMBEDDING_BLOB_SIZE, last_id, BATCH_SIZE))
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        cursor.executemany("UPDATE TM_Faces SET Embedding = ? WHERE FaceID = ?",
+                           [(embedding_to_blob(pickle.loads(blob)), face_id) for face_id, blob in rows])
+        conn.commit()
+        converted += len(rows)
+        last_id = rows[-1][0]
+        print(f"{os.path.basename(db_path)}: {converted}/{pending} faces converted")
+
+    # Give the freed pages back to the file system
+    conn.execute("VACUUM")
+    conn.close()
+    size_after = os.path.getsize(db_path)
+    print(f"{os.path.basename(db_path)}: {converted} faces converted, "
+          f"{size_before / 1e6:.1f} MB -> {size_after / 1e6:.1f} MB")
+    return converted
+
+if __name__ == "__main__":
+    db_folder = sys.argv[1] if len(sys.argv) > 1 else local_db_folder
+    db_files = sorted(glob.glob(os.path.join(db_folder, "*_ImageDB.sqlite")))
+    if not db_files:
+        print(f"No *_ImageDB.sqlite files found in {db_folder}")
+    for db_path in db_files:
+        migrate_db(db_path)
@@ -8,123 +8,351 @@
 #====================================================================================
 
 import os
+import queue
 import sqlite3
+import threading
+import time
+import argparse
+import multiprocessing as mp
 import numpy as np
 import faiss
-import pickle
 import face_recognition
 
 from PIL import Image
+from app.imgTools.imgTools import image_pyramid, scale_box, crop_box
+from app.dbconnector import LOCAL_IMAGE_FOLDER, local_db_path, local_index_path
+from app.dbconnector import init_db, ImageDBWriter, load_embeddings, file_content_hash
+from app.selfisearch.face_index import build_index, publish_index, published_index, INDEX_TYPES
+
 # Used for resizing images
 MAX_DIM = 800
 
-# AWS S3 Config
-s3_bucket_name = "sara-s3-bucket"
-s3_db_folder_prefix = r"FMF/SQLiteDB"  # S3 subfolder where DB is stored
-s3_imagefolder_prefix = r"FMF/FMFImages/"  # S3 image folder folder path
-local_db_folder = r"C:\Work\FMF\DB"  # Local folder to store DB
+# Parallel ingestion: number of images queued per worker, how often progress is printed
+# and how long the writer waits for a result before checking that the workers are alive
+QUEUE_DEPTH_PER_WORKER = 4
+PROGRESS_EVERY_SECS = 5
+WORKER_POLL_SECS = 2
 
+# Messages of a worker on the result queue: (worker_id, kind, task position, result or error)
+TASK_DONE, TASK_FAILED, WORKER_DONE = range(3)
 
-# Local file names
-DB_FILE = "ImageDB.sqlite"
-INDEX_FILE = "faiss_face_index.bin"
-META_FILE = "face_metadata.pkl"
+# function to store the images and face idendified in the image to a db tables
+# Pass the writer of the current run so rows are committed in batches on one connection
+# face_boxes (optional) holds the (top, right, bottom, left) box of each face
+def store_image_and_faces(file_name, file_path, face_embeddings, writer=None, file_info=None, replaces_image_id=None,
+                          face_boxes=None):
+    if writer is None:
+        with ImageDBWriter(local_db_path) as single_writer:
+            single_writer.add(file_name, file_path, face_embeddings, file_info, replaces_image_id, face_boxes)
+        return
+    writer.add(file_name, file_path, face_embeddings, file_info, replaces_image_id, face_boxes)
 
-# Full local paths
-local_db_path = os.path.join(local_db_folder, DB_FILE)
-local_index_path = os.path.join(local_db_folder, INDEX_FILE)
-local_meta_path = os.path.join(local_db_folder, META_FILE)
+# List the images of the folder that still need processing.
+# A task is (img_path, file size, file mtime, manifest row of the previous run or None).
+# Files whose size and mtime match the manifest are skipped without reading them.
+def plan_tasks(folder_path, manifest):
+    tasks = []
+    skipped = 0
+    for file in os.listdir(folder_path):
+        if not file.lower().endswith(('.png', '.jpg', '.jpeg')):
+            continue
+        img_path = os.path.join(folder_path, file)
+        stat = os.stat(img_path)
+        previous = manifest.get(img_path)
+        if previous and previous[0] == stat.st_size and previous[1] == stat.st_mtime:
+            skipped += 1
+            continue
+        tasks.append((img_path, stat.st_size, stat.st_mtime, previous))
+    return tasks, skipped
 
-# Local sub folders 
-LOCAL_IMAGE_FOLDER = r"C:\Work\FMF\Images"
+# Two resolution mode: HOG detection runs on a copy scaled down to detect_dim, the face
+# boxes are mapped back and each face is encoded from a crop of the full resolution image.
+# Finds more of the small faces in wide shots than encoding the MAX_DIM image, without
+# paying for full resolution detection.
+# Returns a list of (encoding, box), box in full resolution pixels.
+def encode_faces_two_res(img_path, detect_dim=MAX_DIM):
+    return encode_image_faces(Image.open(img_path).convert('RGB'), detect_dim)
 
-# Initialize DB
-def init_db():
-    conn = sqlite3.connect(local_db_path)
-    cursor = conn.cursor()
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS TM_Images (
-            ID INTEGER PRIMARY KEY AUTOINCREMENT,
-            FileName TEXT,
-            FilePath TEXT
-        )
-    """)
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS TM_Faces (
-            FaceID INTEGER PRIMARY KEY AUTOINCREMENT,
-            ImageID INTEGER,
-            Embedding BLOB,
-            FOREIGN KEY(ImageID) REFERENCES TM_Images(ID)
-        )
-    """)
-    conn.commit()
-    conn.close()
-# Small funtion to resize image during face identification process for fast performance
-def resize_image(img_path, max_dim=MAX_DIM):
-    # Open image, scale down preserving aspect ratio and return RGB numpy array
-    img = Image.open(img_path).convert('RGB')
-    img.thumbnail((max_dim, max_dim), Image.LANCZOS)
-    return np.array(img)
-# function to store the images and face idendified in the image to a db tables   
-def store_image_and_faces(file_name, file_path, face_embeddings):
-    # Store image and its face embeddings in DB
-    conn = sqlite3.connect(local_db_path)
-    cursor = conn.cursor()
-    cursor.execute("INSERT INTO TM_Images (FileName, FilePath) VALUES (?, ?)", (file_name, file_path))
-    image_id = cursor.lastrowid
-    for emb in face_embeddings:
-        cursor.execute("INSERT INTO TM_Faces (ImageID, Embedding) VALUES (?, ?)", (image_id, pickle.dumps(emb)))
-    conn.commit()
-    conn.close()
+# Detect and encode the faces of a decoded (PIL RGB, full resolution) image.
+# Returns a list of (encoding, box) per face, box in full resolution pixels.
+# detect_dim switches to the two resolution mode (see encode_faces_two_res), otherwise
+# faces are detected and encoded on a copy scaled down to MAX_DIM.
+def encode_image_faces(img, detect_dim=None):
+    if not detect_dim:
+        img_small = img.copy()
+        img_small.thumbnail((MAX_DIM, MAX_DIM), Image.LANCZOS)
+        img_small = np.array(img_small)
+        # If multipe faces adentified in the image will return the list of face encodings
+        locations = face_recognition.face_locations(img_small)
+        face_encodings = face_recognition.face_encodings(img_small, known_face_locations=locations)
+        full_shape = (img.height, img.width)
+        scale = (full_shape[0] / img_small.shape[0], full_shape[1] / img_small.shape[1])
+        return [(enc, scale_box(box, scale, full_shape)) for enc, box in zip(face_encodings, locations)]
+
+    full, small, scale = image_pyramid(img, detect_dim)
+    faces = []
+    for box in face_recognition.face_locations(small, model="hog"):
+        full_box = scale_box(box, scale, full.shape)
+        crop, crop_box_location = crop_box(full, full_box)
+        faces.extend((enc, full_box) for enc in face_recognition.face_encodings(crop, known_face_locations=[crop_box_location]))
+    return faces
+
+# Hash, resize and encode one image. Returns the content hash and a list of
+# (encoding, box) per face, box in full resolution pixels (stored for bib OCR).
+# faces is None when the content hash equals the previous run's (file touched but
+# not changed), so nothing is re-encoded.
+# detect_dim switches to the two resolution mode (see encode_faces_two_res).
+def _encode_image(img_path, previous, detect_dim=None):
+    file_hash = file_content_hash(img_path)
+    if previous and previous[2] == file_hash:
+        return file_hash, None
+    return file_hash, encode_image_faces(Image.open(img_path).convert('RGB'), detect_dim)
+
+# Queue the result of one task on the writer. Every processed file goes into the
+# manifest, also the ones without faces, so a re-run does not encode them again.
+def _store_result(writer, task, file_hash, faces):
+    img_path, size, mtime, previous = task
+    file_info = (size, mtime, file_hash)
+    previous_image_id = previous[3] if previous else None
+    if faces is None:
+        writer.add_manifest(img_path, file_info, image_id=previous_image_id)
+    elif faces:
+        store_image_and_faces(os.path.basename(img_path), img_path, [enc for enc, _ in faces], writer,
+                              file_info, replaces_image_id=previous_image_id, face_boxes=[box for _, box in faces])
+    else:
+        writer.add_manifest(img_path, file_info, replaces_image_id=previous_image_id)
 
 # Main function which loops through the  image folder and process each image
-def process_images(folder_path):
+# Re-running on the same folder only processes new or changed files (see TM_IngestManifest)
+def process_images(folder_path, workers=1, detect_dim=None):
     # Detect faces and store embeddings. Images are resized before encoding
-    for file in os.listdir(folder_path):
-        if file.lower().endswith(('.png', '.jpg', '.jpeg')):
-            img_path = os.path.join(folder_path, file)
+    if workers > 1:
+        return process_images_parallel(folder_path, workers, detect_dim)
+    with ImageDBWriter(local_db_path) as writer:
+        tasks, skipped = plan_tasks(folder_path, writer.load_manifest())
+        print(f"Processing {len(tasks)} images, {skipped} unchanged images skipped")
+        for task in tasks:
+            file = os.path.basename(task[0])
             try:
-                img_small = resize_image(img_path, MAX_DIM)
+                file_hash, faces = _encode_image(task[0], task[3], detect_dim)
             except Exception as e:
                 print(f"Failed to open/resize {file}: {e}")
                 continue
-            # If multipe faces adentified in the image will return the list of face encodings
-            face_encodings = face_recognition.face_encodings(img_small)
-            if face_encodings:
-                store_image_and_faces(file, img_path, face_encodings)
-                print(f"Processed {file}: {len(face_encodings)} faces (resized to max {MAX_DIM}px)")
+            _store_result(writer, task, file_hash, faces)
+            if faces:
+                print(f"Processed {file}: {len(faces)} faces (detected at max {detect_dim or MAX_DIM}px)")
+
+# Worker process: runs handler(task, *args) on the (position, task) items of the task queue.
+# Results go back to the single writer (parent process) through the result queue.
+# current[worker_id] holds the position of the task being worked on. It is shared memory,
+# written at once, unlike queue messages which a crashing process may never flush.
+def run_worker(worker_id, task_queue, result_queue, current, handler, args=()):
+    while True:
+        item = task_queue.get()
+        if item is None:
+            break
+        position, task = item
+        current[worker_id] = position
+        try:
+            result_queue.put((worker_id, TASK_DONE, position, handler(task, *args)))
+        except Exception as e:
+            result_queue.put((worker_id, TASK_FAILED, position, str(e)))
+    # Tell the writer this worker is done
+    result_queue.put((worker_id, WORKER_DONE, None, None))
+
+# Shared in-flight task positions of workers run_worker processes
+def worker_slots(workers):
+    return mp.Array('q', [-1] * workers, lock=False)
+
+# Yields (worker_id, task, result, error) from the run_worker processes until all are done.
+# A worker killed by a crash (dlib segfault on a corrupt file, OOM kill) never sends its done
+# marker: when no result arrives for poll_secs the workers are checked, a dead one counts as
+# done and its in-flight task is reported as failed.
+def collect_results(procs, result_queue, current, tasks, poll_secs=WORKER_POLL_SECS):
+    running = set(range(len(procs)))
+    reported = set()
+    while running:
+        try:
+            worker_id, kind, position, payload = result_queue.get(timeout=poll_secs)
+        except queue.Empty:
+            for worker_id in sorted(running):
+                if procs[worker_id].is_alive():
+                    continue
+                running.discard(worker_id)
+                exitcode = procs[worker_id].exitcode
+                print(f"Worker {worker_id} exited with code {exitcode}")
+                position = current[worker_id]
+                if position >= 0 and position not in reported:
+                    reported.add(position)
+                    yield worker_id, tasks[position], None, f"worker exited with code {exitcode}"
+            continue
+        if kind == WORKER_DONE:
+            running.discard(worker_id)
+            continue
+        reported.add(position)
+        if kind == TASK_DONE:
+            yield worker_id, tasks[position], payload, None
+        else:
+            yield worker_id, tasks[position], None, payload
 
-def build_faiss_index():
+# Worker side of process_images_parallel: (content hash, faces) of one task
+def _encode_task(task, detect_dim=None):
+    return _encode_image(task[0], task[3], detect_dim)
+
+# Feeds tasks to the workers, followed by one stop marker per worker
+def feed_tasks(tasks, task_queue, workers):
+    for task in tasks:
+        task_queue.put(task)
+    for _ in range(workers):
+        task_queue.put(None)
+
+# Parallel version of process_images. Decode/detect/encode runs in a pool of worker
+# processes while this process is the only one writing to SQLite.
+# Both queues are bounded so memory stays flat however big the folder is.
+def process_images_parallel(folder_path, workers=None, detect_dim=None):
+    workers = workers or os.cpu_count() or 1
+    with ImageDBWriter(local_db_path) as writer:
+        tasks, skipped = plan_tasks(folder_path, writer.load_manifest())
+        total = len(tasks)
+        print(f"Processing {total} images with {workers} workers, {skipped} unchanged images skipped")
+
+        task_queue = mp.Queue(maxsize=workers * QUEUE_DEPTH_PER_WORKER)
+        result_queue = mp.Queue(maxsize=workers * QUEUE_DEPTH_PER_WORKER)
+        current = worker_slots(workers)
+        procs = [mp.Process(target=run_worker,
+                            args=(wid, task_queue, result_queue, current, _encode_task, (detect_dim,)), daemon=True)
+                 for wid in range(workers)]
+        for p in procs:
+            p.start()
+        feeder = threading.Thread(target=feed_tasks, args=(enumerate(tasks), task_queue, workers), daemon=True)
+        feeder.start()
+
+        per_worker = [0] * workers
+        done = faces = failed = 0
+        start = last_report = time.time()
+        for worker_id, task, result, error in collect_results(procs, result_queue, current, tasks):
+            done += 1
+            per_worker[worker_id] += 1
+            if error:
+                failed += 1
+                print(f"Failed to open/resize {os.path.basename(task[0])}: {error}")
+            else:
+                file_hash, image_faces = result
+                _store_result(writer, task, file_hash, image_faces)
+                faces += len(image_faces or [])
+
+            now = time.time()
+            if now - last_report >= PROGRESS_EVERY_SECS:
+                last_report = now
+                rate = done / (now - start)
+                print(f"[{done}/{total}] {rate:.1f} images/s, {faces} faces, per worker: {per_worker}")
+
+    for p in procs:
+        p.join()
+    if done < total:
+        # Lost with crashed workers: left for the next run (resumed through the manifest)
+        print(f"{total - done} images not processed, run again to process them")
+        task_queue.cancel_join_thread()
+    else:
+        feeder.join()
+    elapsed = max(time.time() - start, 1e-9)
+    print(f"Processed {done} images ({failed} failed), {faces} faces in {elapsed:.1f}s "
+          f"= {done / elapsed:.1f} images/s, per worker: {per_worker}")
+
+def build_faiss_index(index_type="flat", **index_params):
     # Build FAISS, Face book AI Simalirit Search index from face embeddings in DB for fast and quick access during search
+    # index_type is one of face_index.INDEX_TYPES, index_params are passed to face_index.build_index (nlist, nprobe, ...)
     conn = sqlite3.connect(local_db_path)
     cursor = conn.cursor()
     cursor.execute("SELECT FaceID, Embedding FROM TM_Faces")
     rows = cursor.fetchall()
     conn.close()
 
-    face_ids = []
-    embeddings = []
+    # One vectorized read of all float32 embedding BLOBs
+    face_ids, embeddings = load_embeddings(rows)
 
-    for face_id, emb_blob in rows:
-        face_ids.append(face_id)
-        embeddings.append(pickle.loads(emb_blob))
+    # Create FAISS index. The ID map stores the FaceID of every vector, so a search
+    # returns FaceIDs directly and no separate FAISS row -> FaceID list is needed
+    index = build_index(face_ids, embeddings, index_type, **index_params)
 
-    embeddings = np.array(embeddings).astype('float32')
+    # Save index (and the FaceID -> image table the API maps) as a new generation, a running API server picks it up
+    generation = publish_index(index, local_index_path, local_db_path)
 
-    # Create FAISS index
-    dim = embeddings.shape[1]
-    index = faiss.IndexFlatL2(dim)
-    index.add(embeddings)
+    print(f"FAISS {index_type} index built with {len(face_ids)} faces (generation {generation}).")
+    return index
 
-    # Save index and metadata
-    faiss.write_index(index, local_index_path)
-    with open(local_meta_path, 'wb') as f:
-        pickle.dump(face_ids, f)
+# Highest FaceID already present in an ID-mapped index (0 when empty)
+def last_indexed_face_id(index):
+    if index.ntotal == 0:
+        return 0
+    return int(faiss.vector_to_array(index.id_map).max())
 
-    print(f"FAISS index built with {len(face_ids)} faces.")
+# Append faces ingested since the index was last written instead of rebuilding it.
+# Only TM_Faces rows with a FaceID above the highest one in the index are read.
+# Pass the index already held in memory to skip reading it back from disk.
+def update_faiss_index(index=None):
+    if index is None:
+        _, index_file = published_index(local_index_path)
+        if index_file is None:
+            return build_faiss_index()
+        index = faiss.read_index(index_file)
+    if not hasattr(index, "id_map"):
+        # Index written before FaceID mapping was introduced, rebuild it once
+        return build_faiss_index()
+
+    last_face_id = last_indexed_face_id(index)
+    conn = sqlite3.connect(local_db_path)
+    cursor = conn.cursor()
+    cursor.execute("SELECT FaceID, Embedding FROM TM_Faces WHERE FaceID > ? ORDER BY FaceID", (last_face_id,))
+    rows = cursor.fetchall()
+    # Faces of re-ingested (changed) images are deleted from TM_Faces, drop them from the index too
+    removed = 0
+    cursor.execute("SELECT COUNT(*) FROM TM_Faces WHERE FaceID <= ?", (last_face_id,))
+    if cursor.fetchone()[0] != index.ntotal:
+        cursor.execute("SELECT FaceID FROM TM_Faces WHERE FaceID <= ?", (last_face_id,))
+        live_ids = np.array([row[0] for row in cursor.fetchall()], dtype=np.int64)
+        stale_ids = np.setdiff1d(faiss.vector_to_array(index.id_map), live_ids)
+        try:
+            removed = index.remove_ids(stale_ids)
+        except RuntimeError:
+            # HNSW has no removal: rebuild with the same settings so deleted faces are not served
+            conn.close()
+            print(f"{len(stale_ids)} deleted faces cannot be removed from this index type, rebuilding the index")
+            inner = faiss.downcast_index(index.index)
+            if isinstance(inner, faiss.IndexHNSW):
+                return build_faiss_index("hnsw", hnsw_m=inner.hnsw.nb_neighbors(1), ef_search=inner.hnsw.efSearch)
+            return build_faiss_index()
+    conn.close()
+
+    if rows:
+        face_ids, embeddings = load_embeddings(rows)
+        index.add_with_ids(embeddings, face_ids)
+    if rows or removed:
+        publish_index(index, local_index_path, local_db_path)
+    print(f"FAISS index updated with {len(rows)} new and {removed} removed faces ({index.ntotal} total).")
+    return index
 
 # Main method whihc inits db process images and build faiss index
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Detect faces, store embeddings and build the FAISS index")
+    parser.add_argument("--folder", default=LOCAL_IMAGE_FOLDER, help="Folder with the images to process")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of encoder processes (default 1 = serial, 0 = one per CPU core)")
+    parser.add_argument("--detect-dim", type=int, default=0,
+                        help="Two resolution mode: detect faces at this size, encode them from the full resolution image")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Append the new faces to the existing FAISS index instead of rebuilding it")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default="flat",
+                        help="FAISS index type used on a full rebuild (see face_index.py to compare them)")
+    parser.add_argument("--nlist", type=int, default=0, help="IVF lists (0 = about 4 * sqrt(faces))")
+    parser.add_argument("--nprobe", type=int, default=16, help="IVF lists visited per query")
+    parser.add_argument("--ef-search", type=int, default=64, help="HNSW search depth")
+    args = parser.parse_args()
+
     init_db()
-    process_images(LOCAL_IMAGE_FOLDER)
-    build_faiss_index()
\ No newline at end of file
+    process_images(args.folder, workers=args.workers if args.workers > 0 else (os.cpu_count() or 1),
+                   detect_dim=args.detect_dim or None)
+    if args.incremental:
+        update_faiss_index()
+    else:
+        build_faiss_index(args.index_type, nlist=args.nlist, nprobe=args.nprobe, ef_search=args.ef_search)
\ No newline at end of file
@@ -7,22 +7,28 @@
 # uvicorn uvicorn app.server.api_services:service --reload
 #====================================================================================
 #
-from fastapi import FastAPI, UploadFile, File
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, Response
 from pydantic import BaseModel
+from typing import List, Optional
 import uvicorn
+import hashlib
+import mimetypes
 import os
+import asyncio
 import sqlite3
-import faiss
-import pickle
+import threading
 import numpy as np
-import face_recognition
 
-from app.imgTools.imgTools import resize_image
-from PIL import Image
-from app.dbconnector import local_db_path, local_index_path, local_meta_path
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from app.server.face_encoder import encode_uploaded_image
+from app.server.search_pages import SearchResultPages, make_token, parse_token
+from app.server.event_store import EventStore, UnknownEvent
+from app.server import thumbnail_files
+from app.server.query_cache import QueryCache
+from app.dbconnector import EventID, normalize_bib
 
 # Request model for BIB search
 class BibSearchRequest(BaseModel):
@@ -31,6 +37,8 @@ class BibSearchRequest(BaseModel):
 # Base image location for thumbnails
 workspace_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
 THUMBNAILS_FOLDER = os.path.join(workspace_root, "Images", "Downloads", "Thumbnails")
+# Thumbnail URLs carry ?v=<version> so browsers can cache them for good
+thumbnails = thumbnail_files.ThumbnailFiles(THUMBNAILS_FOLDER)
 
 # Used for resizing images
 MAX_DIM = 800
@@ -38,9 +46,75 @@ MAX_DIM = 800
 # Distance threshold: only return matches with distance <= this value
 DISTANCE_THRESHOLD = 0.19
 
-index = faiss.read_index(local_index_path)
-with open(local_meta_path, 'rb') as f:
-    face_ids = pickle.load(f)
+# Face encoding is CPU bound, it runs in a pool of worker processes so it never blocks
+# the event loop. FAISS search + DB lookups run in a thread pool (FAISS releases the GIL).
+# At most MAX_PENDING_SEARCHES face searches are admitted at a time, extra requests get
+# an immediate 503 with Retry-After instead of queueing up behind each other.
+# With uvicorn --workers N each API process has its own pools: WEB_CONCURRENCY (the env
+# variable uvicorn reads as its default --workers) splits the cores between them.
+API_WORKERS = max(1, int(os.getenv('WEB_CONCURRENCY', 1)))
+ENCODE_WORKERS = int(os.getenv('ENCODE_WORKERS', max(1, (os.cpu_count() or 1) // API_WORKERS)))
+MAX_PENDING_SEARCHES = int(os.getenv('MAX_PENDING_SEARCHES', ENCODE_WORKERS * 4))
+RETRY_AFTER_SECS = 5
+# Most reference photos accepted by /search-face/batch
+MAX_BATCH_FILES = 10
+
+# /search-face/all returns every match page by page. Result lists are kept for 10 minutes
+# so the gallery can fetch the next pages without searching again. A cursor carries its
+# query, so another API worker process (or this one after expiry) searches again instead.
+DEFAULT_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 200
+RANGE_FALLBACK_K = 1000
+search_pages = SearchResultPages(max_entries=1000, ttl_secs=600)
+
+# Repeated searches are answered from LRU caches. Face encodings are keyed by the hash of
+# the uploaded bytes (they depend on nothing else), search results by event, query and the
+# event's search generation, so results computed before an ingestion or re-index are never reused.
+encoding_cache = QueryCache(max_entries=int(os.getenv('ENCODING_CACHE_ENTRIES', 1000)))
+result_cache = QueryCache(max_entries=int(os.getenv('RESULT_CACHE_ENTRIES', 5000)))
+
+encode_pool = None
+search_pool = None
+pending_searches = 0
+index_watch_stop = threading.Event()
+
+# Every search takes an event_id (default EventID). An event's index and metadata are
+# loaded on its first search and the least recently used events are dropped from memory
+# once the loaded ones need more than EVENT_MEMORY_BUDGET_MB.
+# INDEX_MMAP=1 (default) memory maps the index and metadata files instead of reading them,
+# so with uvicorn --workers N every worker starts instantly and shares one copy in memory.
+EVENT_MEMORY_BUDGET_MB = int(os.getenv('EVENT_MEMORY_BUDGET_MB', 2048))
+INDEX_MMAP = os.getenv('INDEX_MMAP', '1') != '0'
+event_store = EventStore(EVENT_MEMORY_BUDGET_MB * 1024 * 1024, mmap=INDEX_MMAP)
+
+# Hot reload: a background thread checks the index generation markers of the loaded
+# events every INDEX_CHECK_SECS and loads newly published indexes while the old ones keep serving
+INDEX_CHECK_SECS = float(os.getenv('INDEX_CHECK_SECS', 5))
+
+# DB side state of an event (cache generation, bib autocomplete), 404 for unknown events
+def get_event_db(event_id):
+    try:
+        return event_store.db(event_id)
+    except UnknownEvent:
+        raise HTTPException(status_code=404, detail=f"Unknown event {event_id}")
+
+# Cache generation of an event. Opening the event DB the first time can migrate it, so
+# async handlers call this in search_pool
+def event_generation(event_id):
+    return get_event_db(event_id).generation.current()
+
+# Loaded index + metadata of an event, loading it on first use, 404 for unknown events
+def get_search_data(event_id):
+    try:
+        return event_store.get(event_id)
+    except UnknownEvent:
+        raise HTTPException(status_code=404, detail=f"No face index for event {event_id}")
+
+# Background loop of the hot reload, stops when stop_event is set
+def watch_index_generation(stop_event, check_every_secs=INDEX_CHECK_SECS):
+    while not stop_event.wait(check_every_secs):
+        for data in event_store.reload_changed():
+            print(f"Loaded event {data.event_id} index generation {data.generation}: {data.index.ntotal} faces")
 
 # -----------------------------------------------------------------------------------------------------
 # Service to get list of faces matching the uploaded image
@@ -81,12 +155,43 @@ def health_check():
     return {"status": "ok"}
 
 @service.get("/images/{filename}")
-def get_image(filename: str):
-    """Serve thumbnail images from the Images/Downloads/Thumbnails folder"""
-    image_path = os.path.join(THUMBNAILS_FOLDER, filename)
-    if os.path.exists(image_path):
-        return FileResponse(image_path)
-    return {"error": "Image not found", "path": image_path}
+def get_image(filename: str, request: Request, v: Optional[str] = None):
+    """Serve thumbnail images from the Images/Downloads/Thumbnails folder.
+
+    Versioned URLs (?v= matching the file) are cached by browsers for a year, the others
+    are revalidated. If-None-Match / If-Modified-Since get a 304, Range requests a 206.
+    """
+    image_path = thumbnails.path(filename)
+    # Packed thumbnails come from the memory mapped pack, no file system call at all.
+    # Otherwise one stat per request gives existence, ETag and Last-Modified
+    packed = thumbnails.packed(filename)
+    st = packed[1] if packed else thumbnails.stat(filename, max_age=0)
+    if st is None:
+        return JSONResponse({"error": "Image not found", "path": image_path}, status_code=404)
+    headers = {
+        "ETag": thumbnail_files.etag(st),
+        "Last-Modified": thumbnail_files.last_modified(st),
+        "Cache-Control": thumbnail_files.IMMUTABLE_CACHE_CONTROL if v == thumbnail_files.version(st)
+                         else thumbnail_files.REVALIDATE_CACHE_CONTROL,
+    }
+    if thumbnail_files.not_modified(request.headers, st):
+        return Response(status_code=304, headers=headers)
+    if packed:
+        data = packed[0]
+        media_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        headers["Accept-Ranges"] = "bytes"
+        byte_range = thumbnail_files.byte_range(request.headers.get("range"), len(data))
+        if byte_range and request.headers.get("if-range", headers["ETag"]) == headers["ETag"]:
+            if byte_range == thumbnail_files.UNSATISFIABLE_RANGE:
+                headers["Content-Range"] = f"bytes */{len(data)}"
+                return Response(status_code=416, headers=headers)
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{len(data)}"
+            return Response(bytes(data[start:end + 1]), status_code=206, media_type=media_type, headers=headers)
+        # Copied once out of the page cache; Starlette responses have no sendfile path
+        return Response(bytes(data), media_type=media_type, headers=headers)
+    # FileResponse answers Range requests (206) itself
+    return FileResponse(image_path, headers=headers, stat_result=st)
 
 @service.get("/logo")
 def get_logo():
@@ -96,60 +201,244 @@ def get_logo():
         return FileResponse(logo_path)
     return {"error": "Logo not found", "path": logo_path}
 
-@service.post("/search-face")
-async def search_face(file: UploadFile = File(...), top_k: int = 5):
-    temp_path = f"temp_{file.filename}"
-    with open(temp_path, "wb") as f:
-        f.write(await file.read())
-    # Resize before encoding to reduce memory and speed up processing
+@service.on_event("startup")
+def start_pools():
+    global encode_pool, search_pool
+    encode_pool = ProcessPoolExecutor(max_workers=ENCODE_WORKERS)
+    search_pool = ThreadPoolExecutor(max_workers=ENCODE_WORKERS)
+    index_watch_stop.clear()
+    threading.Thread(target=watch_index_generation, args=(index_watch_stop,), daemon=True).start()
+    # Warm up the default event so its first search does not wait for the index to load
     try:
-        img = resize_image(temp_path, MAX_DIM)
-    except Exception:
-        # fallback to loading original if resize fails
-        img = face_recognition.load_image_file(temp_path)
+        event_store.get(EventID)
+    except UnknownEvent:
+        print(f"No index for the default event {EventID} yet")
 
-    uploaded_faces = face_recognition.face_encodings(img)
-    os.remove(temp_path)
-    results = []
+@service.on_event("shutdown")
+def stop_pools():
+    index_watch_stop.set()
+    encode_pool.shutdown(wait=False, cancel_futures=True)
+    search_pool.shutdown(wait=False, cancel_futures=True)
 
-    for face_emb in uploaded_faces:
-        face_emb = np.expand_dims(face_emb.astype('float32'), axis=0)
-        distances, indices = index.search(face_emb, top_k)
-        for j, i in enumerate(indices[0]):
-            dist = float(distances[0][j])
-            # only include matches at or below the threshold
-            if dist <= DISTANCE_THRESHOLD:
-                matched_face_id = face_ids[i]
-                conn = sqlite3.connect(local_db_path)
-                cursor = conn.cursor()
-                cursor.execute("""
-                    SELECT TM_Images.FileName, TM_Images.FilePath
-                    FROM TM_Faces
-                    JOIN TM_Images ON TM_Faces.ImageID = TM_Images.ID
-                    WHERE TM_Faces.FaceID = ?
-                """, (matched_face_id,))
-                img_info = cursor.fetchone()
-                conn.close()
+# Search all query faces (one row each) with a single FAISS call and look up the
+# matched images. Returns one list of matches per query face.
+def find_matches_batch(query_faces, top_k, search_data):
+    if len(query_faces) == 0:
+        return []
+    index, face_metadata = search_data.index, search_data.face_metadata
+    distances, indices = index.search(np.ascontiguousarray(query_faces, dtype='float32'), top_k)
+    per_face = []
+    for qi in range(len(query_faces)):
+        results = []
+        for j, matched_face_id in enumerate(indices[qi]):
+            dist = float(distances[qi][j])
+            # only include matches at or below the threshold (-1 means fewer than top_k faces indexed)
+            if matched_face_id >= 0 and dist <= DISTANCE_THRESHOLD:
+                # Resolved from the in-memory table, no SQL per hit
+                img_info = face_metadata.lookup(int(matched_face_id))
                 if img_info:
-                    # Extract thumbnail filename from FilePath
-                    thumbnail_name = os.path.basename(img_info[1])
                     results.append({
-                        "FileName": img_info[0], 
-                        "FilePath": img_info[1], 
-                        "ThumbnailUrl": f"/images/{thumbnail_name}",
-                        "Distance": float(distances[0][j])
+                        "FileName": img_info[1], 
+                        "FilePath": img_info[2], 
+                        "ThumbnailUrl": thumbnails.url(img_info[2]),
+                        "Distance": dist
                     })
                 else:
                     results.append("No Matching Image Found")
+        per_face.append(results)
+    return per_face
+
+# Search the index for every uploaded face and look up the matched images
+def find_matches(uploaded_faces, top_k, search_data):
+    return [match for face_matches in find_matches_batch(uploaded_faces, top_k, search_data) for match in face_matches]
+
+# Encode an uploaded photo in the encoder pool, or take its faces from the encoding cache
+# when the same bytes were uploaded before
+async def encode_upload(data, content_key=None):
+    content_key = content_key or hashlib.sha1(data).hexdigest()
+    faces = encoding_cache.get(content_key)
+    if faces is None:
+        loop = asyncio.get_running_loop()
+        faces = await loop.run_in_executor(encode_pool, encode_uploaded_image, data, MAX_DIM)
+        encoding_cache.put(content_key, faces)
+    return faces
+
+# Admission control: reserve one slot per photo to encode or reject right away when the
+# pools are saturated. An idle server always admits, so a batch larger than the limit still runs.
+def admit_searches(count=1):
+    global pending_searches
+    if pending_searches and pending_searches + count > MAX_PENDING_SEARCHES:
+        raise HTTPException(status_code=503, detail="Server busy, please retry shortly",
+                            headers={"Retry-After": str(RETRY_AFTER_SECS)})
+    pending_searches += count
+
+def release_searches(count=1):
+    global pending_searches
+    pending_searches -= count
+
+@service.post("/search-face")
+async def search_face(file: UploadFile = File(...), top_k: int = 5, event_id: int = EventID):
+    data = await file.read()
+    content_key = hashlib.sha1(data).hexdigest()
+    # Same photo searched again since the last ingestion: no encoding, no search
+    loop = asyncio.get_running_loop()
+    generation = await loop.run_in_executor(search_pool, event_generation, event_id)
+    results = result_cache.get(("face", event_id, content_key, top_k), generation)
+    if results is not None:
+        return {"matches": results}
+
+    admit_searches()
+    try:
+        # Loading an event that is not in memory yet must not block the event loop
+        search_data = await loop.run_in_executor(search_pool, get_search_data, event_id)
+        # Decoded straight from memory in the worker, no temp file
+        uploaded_faces = await encode_upload(data, content_key)
+        results = await loop.run_in_executor(search_pool, find_matches, uploaded_faces, top_k, search_data)
+    finally:
+        release_searches()
+    result_cache.put(("face", event_id, content_key, top_k), results, generation)
     return {"matches": results}
 
+# -----------------------------------------------------------------------------------------------------
+# Service to search several reference photos at once (e.g. the selfies of a whole family)
+# All photos are encoded in parallel and every face is searched in one FAISS call.
+# Results are grouped per uploaded photo and per face found in it.
+# -----------------------------------------------------------------------------------------------------
+
+@service.post("/search-face/batch")
+async def search_face_batch(files: List[UploadFile] = File(...), top_k: int = 5, event_id: int = EventID):
+    if len(files) > MAX_BATCH_FILES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_FILES} photos per request")
+    admit_searches(len(files))
+    try:
+        loop = asyncio.get_running_loop()
+        search_data = await loop.run_in_executor(search_pool, get_search_data, event_id)
+        uploads = [await file.read() for file in files]
+        encoded = await asyncio.gather(*[encode_upload(data) for data in uploads])
+        query_faces = np.vstack(encoded) if encoded else np.empty((0, 128), dtype='float32')
+        per_face = await loop.run_in_executor(search_pool, find_matches_batch, query_faces, top_k, search_data)
+    finally:
+        release_searches(len(files))
+
+    queries = []
+    row = 0
+    for file, faces in zip(files, encoded):
+        face_results = per_face[row:row + len(faces)]
+        row += len(faces)
+        queries.append({
+            "FileName": file.filename,
+            "FacesFound": len(faces),
+            "faces": [{"face_index": i, "matches": matches} for i, matches in enumerate(face_results)],
+        })
+    return {"queries": queries}
+
+# Every indexed face within DISTANCE_THRESHOLD of any query face, one entry per image
+# (closest distance kept), sorted by distance. Uses a FAISS range search so the number of
+# results is not capped by top_k.
+def find_all_matches(query_faces, search_data):
+    if len(query_faces) == 0:
+        return []
+    query_faces = np.ascontiguousarray(query_faces, dtype='float32')
+    index, face_metadata = search_data.index, search_data.face_metadata
+    try:
+        _, distances, labels = index.range_search(query_faces, DISTANCE_THRESHOLD)
+    except RuntimeError:
+        # Index types without range search support: large top k filtered on the threshold
+        distances, labels = index.search(query_faces, min(RANGE_FALLBACK_K, max(1, index.ntotal)))
+        keep = (labels >= 0) & (distances <= DISTANCE_THRESHOLD)
+        distances, labels = distances[keep], labels[keep]
+
+    rows = face_metadata.image_rows(labels)
+    keep = rows >= 0
+    rows, distances = rows[keep], distances[keep]
+    # Group by image with the closest face first, keep one entry per image
+    order = np.lexsort((distances, rows))
+    rows, distances = rows[order], distances[order]
+    first = np.ones(len(rows), dtype=bool)
+    first[1:] = rows[1:] != rows[:-1]
+    rows, distances = rows[first], distances[first]
+    order = np.argsort(distances, kind="stable")
+
+    results = []
+    for row, dist in zip(rows[order], distances[order]):
+        image_id, file_name, file_path = face_metadata.image_info(row)
+        results.append({
+            "ImageID": image_id,
+            "FileName": file_name,
+            "FilePath": file_path,
+            "ThumbnailUrl": thumbnails.url(file_path),
+            "Distance": float(dist)
+        })
+    return results
+
+# -----------------------------------------------------------------------------------------------------
+# Service to get every photo matching the uploaded face, not only the top_k closest faces.
+# Returns the first page and a cursor; GET /search-face/all/page?cursor=... returns the next ones.
+# -----------------------------------------------------------------------------------------------------
+
+@service.post("/search-face/all")
+async def search_face_all(file: UploadFile = File(...),
+                          page_size: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                          event_id: int = EventID):
+    data = await file.read()
+    content_key = hashlib.sha1(data).hexdigest()
+    loop = asyncio.get_running_loop()
+    generation = await loop.run_in_executor(search_pool, event_generation, event_id)
+    cached = result_cache.get(("face-all", event_id, content_key), generation)
+    if cached is None:
+        admit_searches()
+        try:
+            search_data = await loop.run_in_executor(search_pool, get_search_data, event_id)
+            uploaded_faces = await encode_upload(data, content_key)
+            results = await loop.run_in_executor(search_pool, find_all_matches, uploaded_faces, search_data)
+        finally:
+            release_searches()
+        token = make_token(event_id, search_data.generation, uploaded_faces) if len(uploaded_faces) else None
+        cached = (results, token)
+        result_cache.put(("face-all", event_id, content_key), cached, generation)
+    results, token = cached
+    token = search_pages.put(results, token)
+    items, next_cursor, total = search_pages.page(token, 0, page_size)
+    return {"matches": items, "count": total, "next_cursor": next_cursor}
+
+# Results of a cursor token this process does not hold: the search is run again from the
+# query faces in the token. None when the token is not valid or the index was rebuilt since.
+async def search_token_results(token):
+    query = parse_token(token)
+    if query is None:
+        return None
+    event_id, generation, faces = query
+    admit_searches()
+    try:
+        loop = asyncio.get_running_loop()
+        search_data = await loop.run_in_executor(search_pool, get_search_data, event_id)
+        if search_data.generation != generation:
+            return None
+        results = await loop.run_in_executor(search_pool, find_all_matches, faces, search_data)
+    finally:
+        release_searches()
+    search_pages.put(results, token)
+    return results
+
+@service.get("/search-face/all/page")
+async def search_face_all_page(cursor: str, page_size: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)):
+    parsed = SearchResultPages.parse_cursor(cursor)
+    page = search_pages.page(*parsed, page_size) if parsed else None
+    if page is None and parsed and await search_token_results(parsed[0]) is not None:
+        page = search_pages.page(*parsed, page_size)
+    if page is None:
+        raise HTTPException(status_code=404, detail="Cursor expired or invalid, please search again")
+    items, next_cursor, total = page
+    return {"matches": items, "count": total, "next_cursor": next_cursor}
+
 # -----------------------------------------------------------------------------------------------------
 # Service to get list of images matching the BIB number
-# Receives the bib number to search for and does like search as one image may have multiple bibs tagged
+# Receives the bib number to search for and does an exact lookup on the TM_ImageBibs index
 # -----------------------------------------------------------------------------------------------------
 
+# Plain def: FastAPI runs it in its thread pool, so the SQLite query does not block the event loop
 @service.post("/search-bib")
-async def search_bib(request: BibSearchRequest):
+def search_bib(request: BibSearchRequest, event_id: int = EventID):
     """
     Search for images by BIB number.
     
@@ -159,36 +448,71 @@ async def search_bib(request: BibSearchRequest):
     Returns:
         JSON with list of matching images (ID, FileName, FilePath)
     """
-    bib_number = request.bib_number
+    bib_number = normalize_bib(request.bib_number)
+    event_db = get_event_db(event_id)
+    generation = event_db.generation.current()
+    cached = result_cache.get(("bib", event_id, bib_number), generation)
+    if cached is not None:
+        return cached
     results = []
     
-    conn = sqlite3.connect(local_db_path)
+    conn = sqlite3.connect(event_db.db_path)
     cursor = conn.cursor()
     
-    # Search for exact match or comma-separated bibs containing this number
+    # Exact match on the normalized bib table (indexed, so 123 no longer matches 1123 or 1234)
     cursor.execute("""
-        SELECT ID, FileName, FilePath
-        FROM TM_Images
-        WHERE BibTags LIKE ? OR BibTags = ?
-    """, (f'%{bib_number}%', bib_number))
+        SELECT TM_Images.ID, TM_Images.FileName, TM_Images.FilePath
+        FROM TM_ImageBibs
+        JOIN TM_Images ON TM_Images.ID = TM_ImageBibs.ImageID
+        WHERE TM_ImageBibs.Bib = ?
+        ORDER BY TM_Images.ID
+    """, (bib_number,))
     
     rows = cursor.fetchall()
     conn.close()
     
     for row in rows:
-        # Extract thumbnail filename from FilePath
-        thumbnail_name = os.path.basename(row[2])
         results.append({
             "ImageID": row[0],
             "FileName": row[1],
             "FilePath": row[2],
-            "ThumbnailUrl": f"/images/{thumbnail_name}"
+            "ThumbnailUrl": thumbnails.url(row[2])
         })
     
     if not results:
-        return {"message": f"No images found with BIB number: {bib_number}", "matches": []}
-    
-    return {"matches": results, "count": len(results)}
+        response = {"message": f"No images found with BIB number: {bib_number}", "matches": []}
+    else:
+        response = {"matches": results, "count": len(results)}
+    result_cache.put(("bib", event_id, bib_number), response, generation)
+    return response
+
+# -----------------------------------------------------------------------------------------------------
+# Service to suggest BIB numbers starting with what the runner typed so far
+# Answered from the in-memory sorted bib list, no SQL per keystroke
+# -----------------------------------------------------------------------------------------------------
+
+@service.get("/bibs/suggest")
+def suggest_bibs(prefix: str, limit: int = 10, event_id: int = EventID):
+    """
+    Suggest BIB numbers starting with a prefix.
+
+    Returns:
+        JSON with the matching bibs (sorted) and the number of images tagged with each
+    """
+    return {"suggestions": get_event_db(event_id).bib_suggest.suggest(prefix, max(1, min(limit, 50)))}
+
+# -----------------------------------------------------------------------------------------------------
+# Service to report how well the query caches work
+# -----------------------------------------------------------------------------------------------------
+
+@service.get("/cache/stats")
+def cache_stats():
+    """Hit rates of the face encoding and search result caches and the events loaded in memory."""
+    return {
+        "events": event_store.stats(),
+        "encodings": encoding_cache.stats(),
+        "results": result_cache.stats(),
+    }
 
 
 if __name__ == "__main__":
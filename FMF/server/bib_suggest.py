@@ -0,0 +1,66 @@
+#====================================================================================
+# Author: Sara
+# Created on: 18 Oct 2026
+# Brief: In-memory BIB prefix index for the BIB autocomplete. All distinct bibs of the
+#        event are kept sorted with their image counts and answered with bisect, so
+#        typing in the BIB box never hits SQLite. Reloaded when the DB changes.
+#====================================================================================
+
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+
+from app.dbconnector import DBChangeWatcher, normalize_bib
+
+class BibSuggestIndex:
+    """Sorted distinct bibs + image counts of one event DB."""
+
+    def __init__(self, db_path, check_every_secs=2.0):
+        self.db_path = db_path
+        self.check_every_secs = check_every_secs
+        self.watcher = DBChangeWatcher(db_path)
+        self._lock = threading.Lock()
+        self._last_check = time.time()
+        self._data = self._load()
+
+    def _load(self):
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        # Joined to TM_Images so rows left behind by deleted / replaced images are not counted
+        cursor.execute("""
+            SELECT TM_ImageBibs.Bib, COUNT(DISTINCT TM_ImageBibs.ImageID)
+            FROM TM_ImageBibs
+            JOIN TM_Images ON TM_Images.ID = TM_ImageBibs.ImageID
+            GROUP BY TM_ImageBibs.Bib
+            ORDER BY TM_ImageBibs.Bib
+        """)
+        rows = cursor.fetchall()
+        conn.close()
+        return [row[0] for row in rows], [row[1] for row in rows]
+
+    def refresh_if_changed(self):
+        """Reload when another connection committed, checked at most every check_every_secs."""
+        now = time.time()
+        if now - self._last_check < self.check_every_secs:
+            return
+        with self._lock:
+            if now - self._last_check < self.check_every_secs:
+                return
+            self._last_check = now
+            if self.watcher.changed():
+                # Swap in one assignment so concurrent readers see either the old or new lists
+                self._data = self._load()
+
+    def suggest(self, prefix, limit=10):
+        """Up to limit bibs starting with prefix, in sorted order, with their image counts."""
+        self.refresh_if_changed()
+        bibs, counts = self._data
+        prefix = normalize_bib(prefix)
+        start = bisect_left(bibs, prefix)
+        end = bisect_left(bibs, prefix + "\uffff", start)
+        end = min(end, start + limit)
+        return [{"Bib": bibs[i], "Count": counts[i]} for i in range(start, end)]
+
+    def __len__(self):
+        return len(self._data[0])
@@ -0,0 +1,184 @@
+#====================================================================================
+# Author: Sara
+# Created on: 18 Oct 2026
+# Brief: Search data of many events in one API process. Each event's FAISS index and
+#        FaceID -> image table are loaded on first use and kept in an LRU bounded by a
+#        memory budget, the coldest events are dropped when a new one does not fit.
+#        Loaded events are hot reloaded when a new index generation is published.
+#        With mmap on, the index and the saved FaceID -> image table of the generation are
+#        memory mapped read only, so uvicorn --workers N share one page cache copy.
+#====================================================================================
+
+import os
+import threading
+from collections import OrderedDict, namedtuple
+
+import faiss
+
+from app.dbconnector import event_db_path, event_index_path
+from app.bibSearch.migrate_bib_tags import migrate_if_needed
+from app.selfisearch.face_index import read_index_generation, read_index_shared, published_index, metadata_path
+from app.server.bib_suggest import BibSuggestIndex
+from app.face_metadata import FaceMetadataTable
+from app.server.query_cache import SearchGeneration
+
+# Everything a search of one event reads, replaced as a whole on reload. A search takes
+# the current SearchData once and uses only that, so in-flight searches finish on the
+# generation they started on and never mix an index with metadata of another generation.
+SearchData = namedtuple("SearchData", ["event_id", "index", "face_metadata", "generation", "nbytes"])
+
+class UnknownEvent(KeyError):
+    """No DB / index exists for the requested event."""
+
+class EventDB:
+    """Per event DB side state: cache generation and BIB autocomplete. Cheap, never evicted."""
+
+    def __init__(self, event_id):
+        self.event_id = event_id
+        self.db_path = event_db_path(event_id)
+        # DBs created before the normalized bib table get it on first open, /search-bib needs it
+        migrate_if_needed(self.db_path)
+        self.generation = SearchGeneration(self.db_path)
+        self._bib_suggest = None
+        self._lock = threading.Lock()
+
+    @property
+    def bib_suggest(self):
+        # Built on the first autocomplete request of the event
+        with self._lock:
+            if self._bib_suggest is None:
+                self._bib_suggest = BibSuggestIndex(self.db_path)
+            return self._bib_suggest
+
+class EventStore:
+    """LRU of loaded SearchData per event, bounded by memory_budget bytes."""
+
+    def __init__(self, memory_budget, mmap=True):
+        self.memory_budget = memory_budget
+        self.mmap = mmap
+        self._loaded = OrderedDict()
+        self._dbs = {}
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self._db_locks = {}
+        self.loads = 0
+        self.evictions = 0
+
+    def db(self, event_id):
+        """EventDB of an event, UnknownEvent when the event has no DB."""
+        with self._lock:
+            event_db = self._dbs.get(event_id)
+        if event_db is not None:
+            return event_db
+        # Checked first: connecting to a missing DB file would create it
+        if not os.path.exists(event_db_path(event_id)):
+            raise UnknownEvent(event_id)
+        # Opening may migrate the DB (a table rewrite): done under a lock of the event only,
+        # so requests for other events are not blocked meanwhile
+        with self._lock:
+            db_lock = self._db_locks.setdefault(event_id, threading.Lock())
+        with db_lock:
+            with self._lock:
+                event_db = self._dbs.get(event_id)
+            if event_db is None:
+                event_db = EventDB(event_id)
+                with self._lock:
+                    self._dbs[event_id] = event_db
+            return event_db
+
+    def get(self, event_id):
+        """SearchData of an event, loaded on first use. UnknownEvent when it has no index."""
+        with self._lock:
+            data = self._loaded.get(event_id)
+            if data is not None:
+                self._loaded.move_to_end(event_id)
+                return data
+        # One thread loads an event, other requests for it wait; other events are not blocked
+        with self._load_lock(event_id):
+            with self._lock:
+                data = self._loaded.get(event_id)
+            return data if data is not None else self._load(event_id)
+
+    def _load_lock(self, event_id):
+        # Checked first (UnknownEvent) so random event ids do not each leave a lock behind
+        self.db(event_id)
+        with self._lock:
+            return self._load_locks.setdefault(event_id, threading.Lock())
+
+    def _load(self, event_id):
+        event_db = self.db(event_id)
+        index_path = event_index_path(event_id)
+        # Generation and its own file read together, so index and metadata always match
+        generation, index_file = published_index(index_path)
+        if index_file is None:
+            raise UnknownEvent(event_id)
+        index, face_metadata = self._read(index_file, metadata_path(index_path, generation), event_db.db_path)
+        # The index file size is close to the index memory for the index types we build.
+        # Mapped pages are counted too: they are shared between workers, not free.
+        data = SearchData(event_id, index, face_metadata, generation,
+                          os.path.getsize(index_file) + face_metadata.nbytes)
+        with self._lock:
+            # One reference assignment, atomic for the threads serving searches
+            self._loaded[event_id] = data
+            self._loaded.move_to_end(event_id)
+            self._evict(keep=event_id)
+            self.loads += 1
+        event_db.generation.bump_index()
+        return data
+
+    def _read(self, index_file, metadata_folder, db_path):
+        if not self.mmap:
+            return faiss.read_index(index_file), FaceMetadataTable.load(db_path)
+        index = read_index_shared(index_file)
+        try:
+            face_metadata = FaceMetadataTable.open(metadata_folder)
+        except OSError:
+            # Index published without its table (older build or publish_index without db_path)
+            face_metadata = FaceMetadataTable.load(db_path)
+        return index, face_metadata
+
+    def _evict(self, keep):
+        # Drop the least recently used events until the budget fits (the one just loaded stays).
+        # Searches still running on an evicted event keep their SearchData until they finish.
+        while sum(d.nbytes for d in self._loaded.values()) > self.memory_budget and len(self._loaded) > 1:
+            event_id = next(iter(self._loaded))
+            if event_id == keep:
+                self._loaded.move_to_end(event_id)
+                continue
+            del self._loaded[event_id]
+            self.evictions += 1
+            print(f"Evicted event {event_id} from memory")
+
+    def reload_changed(self):
+        """Reload the loaded events whose index generation changed. Returns the reloaded SearchData."""
+        with self._lock:
+            loaded = list(self._loaded.values())
+        reloaded = []
+        for data in loaded:
+            if read_index_generation(event_index_path(data.event_id)) == data.generation:
+                continue
+            # Same lock as a first search load, so the two never load the event at the same time
+            with self._load_lock(data.event_id):
+                with self._lock:
+                    current = self._loaded.get(data.event_id)
+                if current is not data:
+                    # Evicted (loaded again on its next search) or already reloaded meanwhile
+                    continue
+                try:
+                    reloaded.append(self._load(data.event_id))
+                except Exception as e:
+                    # Keep serving the current generation, retried on the next check
+                    print(f"Reloading event {data.event_id} failed, still serving generation {data.generation}: {e}")
+        return reloaded
+
+    def stats(self):
+        with self._lock:
+            events = [{"event_id": d.event_id, "faces": d.index.ntotal, "generation": d.generation,
+                       "bytes": d.nbytes} for d in reversed(self._loaded.values())]
+        return {
+            "memory_budget": self.memory_budget,
+            "memory_used": sum(e["bytes"] for e in events),
+            "loads": self.loads,
+            "evictions": self.evictions,
+            "loaded": events,
+        }
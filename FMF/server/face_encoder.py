@@ -0,0 +1,29 @@
+#====================================================================================
+# Author: Sara
+# Created on: 18 Oct 2026
+# Brief: Face encoding for the API, run in worker processes of api_services.
+#        Kept in its own small module so worker processes do not import
+#        api_services (and load the FAISS index) when they start.
+#====================================================================================
+
+import io
+import numpy as np
+import face_recognition
+
+from app.imgTools.imgTools import decode_image_bytes
+
+# Used for resizing images
+MAX_DIM = 800
+
+# Decode the uploaded image bytes and encode it, returns one float32 row per face found
+def encode_uploaded_image(data, max_dim=MAX_DIM):
+    # Reduced size decode before encoding to reduce memory and speed up processing
+    try:
+        img = decode_image_bytes(data, max_dim)
+    except Exception:
+        # fallback to loading original if resize fails
+        img = face_recognition.load_image_file(io.BytesIO(data))
+    uploaded_faces = face_recognition.face_encodings(img)
+    if not uploaded_faces:
+        return np.empty((0, 128), dtype='float32')
+    return np.vstack(uploaded_faces).astype('float32')
@@ -0,0 +1,90 @@
+#====================================================================================
+# Author: Sara
+# Created on: 18 Oct 2026
+# Brief: Bounded LRU caches for repeated searches (same BIB, same selfie uploaded again)
+#        and the generation counter they are keyed to. The generation changes when the
+#        FAISS index is reloaded or another connection commits to the event DB, so
+#        entries computed before an ingestion are never returned after it.
+#====================================================================================
+
+import threading
+from collections import OrderedDict
+
+from app.dbconnector import DBChangeWatcher
+
+class QueryCache:
+    """LRU cache of at most max_entries values, each stored with the generation it was computed for."""
+
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+
+    def get(self, key, generation=None):
+        """Cached value of key for this generation, None on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] != generation:
+                # Computed before the last ingestion / re-index
+                del self._entries[key]
+                self.stale += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value, generation=None):
+        with self._lock:
+            self._entries[key] = (generation, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+class SearchGeneration:
+    """(index generation, DB generation) of the data searches are answered from.
+
+    The index generation is bumped by the server when it reloads the FAISS index, the DB
+    generation whenever PRAGMA data_version shows a commit from another connection.
+    """
+
+    def __init__(self, db_path):
+        self.watcher = DBChangeWatcher(db_path)
+        self._lock = threading.Lock()
+        self.index_generation = 0
+        self.db_generation = 0
+
+    def bump_index(self):
+        with self._lock:
+            self.index_generation += 1
+
+    def current(self):
+        with self._lock:
+            if self.watcher.changed():
+                self.db_generation += 1
+            return self.index_generation, self.db_generation
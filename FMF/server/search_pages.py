@@ -0,0 +1,86 @@
+#====================================================================================
+# Author: Sara
+# Created on: 18 Oct 2026
+# Brief: Keeps the full result list of a search in memory so the gallery can load it
+#        page by page with a cursor, without running the search again.
+#        Cursors are self-contained (event, index generation, query faces), so with
+#        uvicorn --workers N a worker that did not run the search recomputes the results.
+#====================================================================================
+
+import base64
+import secrets
+import struct
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# Token header: event id, index generation, embedding dimension
+_TOKEN_HEADER = struct.Struct("<qqi")
+
+def make_token(event_id, generation, faces):
+    """Cursor token of a search: the event, the index generation searched and the query
+    face encodings, URL safe. parse_token gives them back."""
+    faces = np.ascontiguousarray(faces, dtype=np.float32).reshape(len(faces), -1)
+    raw = _TOKEN_HEADER.pack(event_id, generation, faces.shape[1]) + faces.tobytes()
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def parse_token(token):
+    """(event_id, generation, faces) of a make_token token, None if it is not one."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        event_id, generation, dim = _TOKEN_HEADER.unpack_from(raw)
+    except (ValueError, struct.error):
+        return None
+    body = raw[_TOKEN_HEADER.size:]
+    if dim <= 0 or len(body) % (dim * 4):
+        return None
+    return event_id, generation, np.frombuffer(body, dtype=np.float32).reshape(-1, dim)
+
+class SearchResultPages:
+    """Bounded, expiring store of search results addressed by an opaque cursor.
+
+    A cursor is "<token>:<offset>". The least recently used result lists are dropped
+    once more than max_entries are stored, and every list expires ttl_secs after the
+    search that produced it.
+    """
+
+    def __init__(self, max_entries=1000, ttl_secs=600):
+        self.max_entries = max_entries
+        self.ttl_secs = ttl_secs
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, results, token=None):
+        """Store a result list under token (a random one by default) and return the token."""
+        token = token or secrets.token_urlsafe(12)
+        with self._lock:
+            self._entries[token] = (time.time(), results)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return token
+
+    def page(self, token, offset, page_size):
+        """Return (items, next_cursor, total) or None when the token is unknown or expired."""
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            if time.time() - entry[0] > self.ttl_secs:
+                del self._entries[token]
+                return None
+            self._entries.move_to_end(token)
+        results = entry[1]
+        items = results[offset:offset + page_size]
+        next_offset = offset + page_size
+        next_cursor = f"{token}:{next_offset}" if next_offset < len(results) else None
+        return items, next_cursor, len(results)
+
+    @staticmethod
+    def parse_cursor(cursor):
+        """Split a cursor into (token, offset), None if malformed."""
+        token, _, offset = (cursor or "").partition(":")
+        if not token or not offset.isdigit():
+            return None
+        return token, int(offset)
@@ -0,0 +1,149 @@
+#====================================================================================
+# Author: Sara
+# Created on: 18 Oct 2026
+# Brief: Cache friendly thumbnail serving. Thumbnail URLs carry a version (?v=) taken
+#        from the file's mtime and size, so a versioned URL never changes content and
+#        is served with a one year immutable Cache-Control. Every response has an ETag
+#        and Last-Modified, revalidations get a 304 without a body.
+#        When the folder has a thumbnail pack (imgTools/thumbnail_pack.py) thumbnails
+#        are served from the memory mapped pack, files not in it or rewritten after
+#        packing from the folder. A pack created or updated later is picked up.
+#====================================================================================
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+
+from app.imgTools.thumbnail_pack import ThumbnailPack
+
+# Cache-Control of versioned URLs (content never changes) and of the others
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "public, no-cache"
+
+# Most file stats kept for thumbnail URLs, least recently used dropped first
+STAT_CACHE_ENTRIES = 10000
+
+class ThumbnailFiles:
+    """os.stat of the thumbnails of a folder, cached for version_ttl_secs in an LRU of
+    max_entries files, and its pack if any."""
+
+    def __init__(self, folder, version_ttl_secs=60.0, max_entries=STAT_CACHE_ENTRIES):
+        self.folder = folder
+        self.version_ttl_secs = version_ttl_secs
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._stats = OrderedDict()
+        # Kept even before a pack exists: it is picked up when thumbnail_pack creates one
+        self.pack = ThumbnailPack(folder)
+
+    def path(self, filename):
+        # Only plain file names, nothing outside the thumbnail folder
+        return os.path.join(self.folder, os.path.basename(filename))
+
+    def packed(self, filename):
+        """(bytes view, stat) of a packed thumbnail. None when it is not packed, or when the file
+        in the folder was rewritten after packing: the newer file is served until the next pack."""
+        filename = os.path.basename(filename)
+        packed = self.pack.get(filename)
+        if packed is None or self._rewritten(filename, packed[1]):
+            return None
+        return packed
+
+    def _rewritten(self, filename, packed_stat):
+        # Only names found in the pack get here, so caching their stat keeps the cache bounded
+        st = self._cached_stat(filename, self.pack.check_every_secs)
+        return st is not None and st.st_mtime_ns > packed_stat.st_mtime_ns
+
+    def _os_stat(self, filename):
+        try:
+            return os.stat(self.path(filename))
+        except OSError:
+            return None
+
+    def _cached_stat(self, filename, max_age):
+        now = time.time()
+        with self._lock:
+            cached = self._stats.get(filename)
+            if cached and now - cached[0] < max_age:
+                self._stats.move_to_end(filename)
+                return cached[1]
+        st = self._os_stat(filename)
+        with self._lock:
+            self._stats[filename] = (now, st)
+            self._stats.move_to_end(filename)
+            while len(self._stats) > self.max_entries:
+                self._stats.popitem(last=False)
+        return st
+
+    def stat(self, filename, max_age=None):
+        """os.stat_result of a thumbnail, None if it does not exist. Cached up to max_age seconds,
+        max_age=0 (request path, any name a client asks for) stats without touching the cache.
+        Packed thumbnails are answered from the pack index unless rewritten since packing."""
+        filename = os.path.basename(filename)
+        packed_stat = self.pack.stat(filename)
+        if packed_stat and not self._rewritten(filename, packed_stat):
+            return packed_stat
+        max_age = self.version_ttl_secs if max_age is None else max_age
+        if max_age <= 0:
+            return self._os_stat(filename)
+        return self._cached_stat(filename, max_age)
+
+    def url(self, file_path):
+        """/images/ URL of the thumbnail of an original image, with its version when it exists."""
+        filename = os.path.basename(file_path)
+        st = self.stat(filename)
+        return f"/images/{filename}?v={version(st)}" if st else f"/images/{filename}"
+
+# Version / ETag value of a file: changes whenever the file is rewritten
+def version(st):
+    return f"{st.st_mtime_ns:x}-{st.st_size:x}"
+
+def etag(st):
+    return f'"{version(st)}"'
+
+def last_modified(st):
+    return formatdate(st.st_mtime, usegmt=True)
+
+# byte_range result of a range that starts past the end of the file (answered with a 416)
+UNSATISFIABLE_RANGE = "unsatisfiable"
+
+# (start, end) byte positions (end inclusive) of a single "bytes=" Range header,
+# UNSATISFIABLE_RANGE when it asks for no byte of the file (bytes=-0, start past the end),
+# None to send the whole file (no header, several ranges or a malformed one)
+def byte_range(range_header, size):
+    if not range_header or not range_header.startswith("bytes=") or "," in range_header:
+        return None
+    start, _, end = range_header[len("bytes="):].strip().partition("-")
+    try:
+        if start:
+            start, end = int(start), int(end) if end else None
+            if start < 0 or (end is not None and end < start):
+                return None
+            if start >= size:
+                return UNSATISFIABLE_RANGE
+            return start, size - 1 if end is None else min(end, size - 1)
+        suffix = int(end)
+    except ValueError:
+        return None
+    if suffix < 0:
+        return None
+    if suffix == 0 or size == 0:
+        return UNSATISFIABLE_RANGE
+    return max(0, size - suffix), size - 1
+
+# True when the client's cached copy (If-None-Match / If-Modified-Since) is still current
+def not_modified(headers, st):
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [t.strip() for t in if_none_match.split(",")]
+        current = etag(st)
+        return "*" in tags or current in tags or f"W/{current}" in tags
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(st.st_mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
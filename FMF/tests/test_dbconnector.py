@@ -0,0 +1,49 @@
+#====================================================================================
+# Author: Sara
+# Created on: 18 Oct 2026
+# Brief: Tests of the batched ImageDBWriter on the DB schemas it has to write to.
+#           python -m pytest FMF/tests
+#====================================================================================
+
+import sqlite3
+
+import numpy as np
+
+from app.dbconnector import ImageDBWriter, load_embeddings
+
+# Schema created by the init_db of the legacy FMF/process_images.py: no EventID, no face
+# box columns, no TM_IngestManifest / TM_ImageBibs
+LEGACY_SCHEMA = """
+    CREATE TABLE TM_Images (
+        ID INTEGER PRIMARY KEY AUTOINCREMENT,
+        FileName TEXT,
+        FilePath TEXT
+    );
+    CREATE TABLE TM_Faces (
+        FaceID INTEGER PRIMARY KEY AUTOINCREMENT,
+        ImageID INTEGER,
+        Embedding BLOB,
+        FOREIGN KEY(ImageID) REFERENCES TM_Images(ID)
+    );
+"""
+
+def test_writer_on_legacy_schema(tmp_path):
+    db_path = str(tmp_path / "legacy.sqlite")
+    conn = sqlite3.connect(db_path)
+    conn.executescript(LEGACY_SCHEMA)
+    conn.close()
+
+    embeddings = np.random.default_rng(0).random((3, 128)).astype(np.float32)
+    with ImageDBWriter(db_path, event_id=None) as writer:
+        writer.add("a.jpg", "/photos/a.jpg", embeddings[:2])
+        writer.add("b.jpg", "/photos/b.jpg", embeddings[2:])
+
+    conn = sqlite3.connect(db_path)
+    images = conn.execute("SELECT ID, FileName, FilePath FROM TM_Images ORDER BY ID").fetchall()
+    faces = conn.execute("SELECT FaceID, Embedding FROM TM_Faces ORDER BY FaceID").fetchall()
+    image_ids = [row[0] for row in conn.execute("SELECT ImageID FROM TM_Faces ORDER BY FaceID")]
+    conn.close()
+    assert images == [(1, "a.jpg", "/photos/a.jpg"), (2, "b.jpg", "/photos/b.jpg")]
+    assert image_ids == [1, 1, 2]
+    _, stored = load_embeddings(faces)
+    np.testing.assert_array_equal(stored, embeddings)
@@ -0,0 +1,38 @@
+#====================================================================================
+# Author: Sara
+# Created on: 18 Oct 2026
+# Brief: Tests of the per event locking of EventStore.
+#           python -m pytest FMF/tests
+#====================================================================================
+
+import threading
+
+import app.server.event_store as event_store
+from app.server.event_store import EventStore
+
+def test_slow_db_open_does_not_block_other_events(tmp_path, monkeypatch):
+    opening = threading.Event()
+    release = threading.Event()
+
+    class SlowEventDB:
+        # Event 1 stands for a DB being migrated on first open
+        def __init__(self, event_id):
+            if event_id == 1:
+                opening.set()
+                release.wait(5)
+            self.event_id = event_id
+
+    monkeypatch.setattr(event_store, "event_db_path", lambda event_id: str(tmp_path))
+    monkeypatch.setattr(event_store, "EventDB", SlowEventDB)
+    store = EventStore(memory_budget=0)
+
+    opened = []
+    slow = threading.Thread(target=lambda: opened.append(store.db(1)))
+    slow.start()
+    assert opening.wait(5)
+    # Answered while event 1 is still opening
+    assert store.db(2).event_id == 2
+    assert slow.is_alive()
+    release.set()
+    slow.join(5)
+    assert opened[0] is store.db(1)
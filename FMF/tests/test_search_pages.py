@@ -0,0 +1,23 @@
+#====================================================================================
+# Author: Sara
+# Created on: 18 Oct 2026
+# Brief: Tests of the self-contained search cursor tokens.
+#           python -m pytest FMF/tests
+#====================================================================================
+
+import numpy as np
+
+from app.server.search_pages import make_token, parse_token
+
+def test_token_round_trip():
+    faces = np.random.default_rng(0).random((2, 128))
+    event_id, generation, parsed = parse_token(make_token(7, 3, faces))
+    assert (event_id, generation) == (7, 3)
+    np.testing.assert_array_equal(parsed, faces.astype(np.float32))
+
+def test_invalid_token():
+    token = make_token(7, 3, np.zeros((1, 128)))
+    assert parse_token("") is None
+    assert parse_token("not a token!") is None
+    # Cut face data
+    assert parse_token(token[:-8]) is None
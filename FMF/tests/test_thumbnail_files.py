@@ -0,0 +1,33 @@
+#====================================================================================
+# Author: Sara
+# Created on: 18 Oct 2026
+# Brief: Tests of the Range header parsing used to serve packed thumbnails.
+#           python -m pytest FMF/tests
+#====================================================================================
+
+from app.server.thumbnail_files import byte_range, UNSATISFIABLE_RANGE
+
+def test_byte_range_start_end():
+    assert byte_range("bytes=0-99", 1000) == (0, 99)
+    assert byte_range("bytes=100-", 1000) == (100, 999)
+    # End past the file is cut to the last byte
+    assert byte_range("bytes=900-5000", 1000) == (900, 999)
+
+def test_byte_range_suffix():
+    assert byte_range("bytes=-10", 1000) == (990, 999)
+    assert byte_range("bytes=-5000", 1000) == (0, 999)
+
+def test_byte_range_unsatisfiable():
+    assert byte_range("bytes=1000-", 1000) == UNSATISFIABLE_RANGE
+    assert byte_range("bytes=99999-", 1000) == UNSATISFIABLE_RANGE
+    assert byte_range("bytes=-0", 1000) == UNSATISFIABLE_RANGE
+    assert byte_range("bytes=-10", 0) == UNSATISFIABLE_RANGE
+
+def test_byte_range_whole_file():
+    # No header, several ranges, other units and malformed values send the whole file
+    assert byte_range(None, 1000) is None
+    assert byte_range("", 1000) is None
+    assert byte_range("bytes=0-1,5-6", 1000) is None
+    assert byte_range("items=0-1", 1000) is None
+    assert byte_range("bytes=abc-", 1000) is None
+    assert byte_range("bytes=50-10", 1000) is None